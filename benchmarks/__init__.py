@@ -0,0 +1,4 @@
+"""Benchmarks over synthetic Biolink-shaped knowledge graphs.
+
+Run with `python -m benchmarks.run --help`.
+"""
@@ -0,0 +1,111 @@
+"""Synthetic knowledge graph generation."""
+import itertools
+import random
+from typing import Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from binder.build_db import add_data
+
+# category -> (CURIE prefix, relative frequency)
+CATEGORIES = {
+    "biolink:Gene": ("NCBIGene", 4),
+    "biolink:ChemicalSubstance": ("CHEBI", 3),
+    "biolink:Disease": ("MONDO", 2),
+    "biolink:PhenotypicFeature": ("HP", 1),
+}
+# predicate -> relative frequency
+PREDICATES = {
+    "biolink:related_to": 8,
+    "biolink:interacts_with": 4,
+    "biolink:affects": 4,
+    "biolink:treats": 1,
+    "biolink:causes": 1,
+}
+
+
+class GraphSpec:
+    """Size and shape of a synthetic graph.
+
+    Node popularity follows a Zipf-like law: the node of rank r is an
+    edge endpoint with weight 1 / (r + 1) ** skew, so skew=0 is uniform.
+    """
+
+    def __init__(
+        self,
+        num_nodes: int = 1000,
+        num_edges: int = 5000,
+        skew: float = 1.0,
+        categories: Optional[Dict[str, Tuple[str, float]]] = None,
+        predicates: Optional[Dict[str, float]] = None,
+        seed: int = 0,
+    ):
+        """Initialize."""
+        self.num_nodes = num_nodes
+        self.num_edges = num_edges
+        self.skew = skew
+        self.categories = CATEGORIES if categories is None else categories
+        self.predicates = PREDICATES if predicates is None else predicates
+        self.seed = seed
+
+    def as_dict(self) -> Dict:
+        """Get JSON-serializable description."""
+        return {
+            "num_nodes": self.num_nodes,
+            "num_edges": self.num_edges,
+            "skew": self.skew,
+            "categories": {
+                category: weight for category, (_, weight) in self.categories.items()
+            },
+            "predicates": dict(self.predicates),
+            "seed": self.seed,
+        }
+
+
+def generate_graph(spec: GraphSpec) -> Tuple[List[Dict], List[Dict]]:
+    """Generate nodes and edges, ordered by node popularity."""
+    rng = random.Random(spec.seed)
+    categories = list(spec.categories)
+    node_categories = rng.choices(
+        categories,
+        weights=[spec.categories[category][1] for category in categories],
+        k=spec.num_nodes,
+    )
+    nodes = [
+        {
+            "id": f"{spec.categories[category][0]}:{idx}",
+            "category": category,
+        }
+        for idx, category in enumerate(node_categories)
+    ]
+
+    cum_weights = list(
+        itertools.accumulate(1 / (rank + 1) ** spec.skew for rank in range(len(nodes)))
+    )
+    subjects = rng.choices(nodes, cum_weights=cum_weights, k=spec.num_edges)
+    objects = rng.choices(nodes, cum_weights=cum_weights, k=spec.num_edges)
+    predicates = rng.choices(
+        list(spec.predicates),
+        weights=list(spec.predicates.values()),
+        k=spec.num_edges,
+    )
+    edges = [
+        {
+            "id": f"edge:{idx}",
+            "subject": subject["id"],
+            "predicate": predicate,
+            "object": object["id"],
+        }
+        for idx, (subject, predicate, object) in enumerate(
+            zip(subjects, predicates, objects)
+        )
+    ]
+    return nodes, edges
+
+
+async def build_database(database_file: str, spec: GraphSpec) -> Tuple[List, List]:
+    """Write synthetic graph to database file, returning its nodes and edges."""
+    nodes, edges = generate_graph(spec)
+    async with aiosqlite.connect(database_file) as connection:
+        await add_data(connection, nodes, edges)
+    return nodes, edges
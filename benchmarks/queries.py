@@ -0,0 +1,117 @@
+"""Catalog of benchmark query shapes."""
+from typing import Callable, Dict, List
+
+
+def one_hop(pinned: str) -> Dict:
+    """Get everything connected to a pinned node."""
+    return {
+        "nodes": {"n0": {"ids": [pinned]}, "n1": {}},
+        "edges": {"e01": {"subject": "n0", "object": "n1"}},
+    }
+
+
+def two_hop(pinned: str) -> Dict:
+    """Get genes affected by chemicals related to a pinned node."""
+    return {
+        "nodes": {
+            "n0": {"ids": [pinned]},
+            "n1": {"categories": ["biolink:ChemicalSubstance"]},
+            "n2": {"categories": ["biolink:Gene"]},
+        },
+        "edges": {
+            "e01": {"subject": "n0", "object": "n1"},
+            "e12": {
+                "subject": "n1",
+                "object": "n2",
+                "predicates": ["biolink:affects"],
+            },
+        },
+    }
+
+
+def star(pinned: str) -> Dict:
+    """Get three neighbors of a pinned node along different predicates."""
+    return {
+        "nodes": {
+            "n0": {"ids": [pinned]},
+            "n1": {},
+            "n2": {},
+            "n3": {},
+        },
+        "edges": {
+            "e01": {
+                "subject": "n0",
+                "object": "n1",
+                "predicates": ["biolink:treats"],
+            },
+            "e02": {
+                "subject": "n0",
+                "object": "n2",
+                "predicates": ["biolink:affects"],
+            },
+            "e03": {
+                "subject": "n3",
+                "object": "n0",
+                "predicates": ["biolink:causes"],
+            },
+        },
+    }
+
+
+def loop(pinned: str) -> Dict:
+    """Get triangles through a pinned node."""
+    return {
+        "nodes": {"n0": {"ids": [pinned]}, "n1": {}, "n2": {}},
+        "edges": {
+            "e01": {
+                "subject": "n0",
+                "object": "n1",
+                "predicates": ["biolink:interacts_with"],
+            },
+            "e12": {
+                "subject": "n1",
+                "object": "n2",
+                "predicates": ["biolink:affects"],
+            },
+            "e20": {
+                "subject": "n2",
+                "object": "n0",
+                "predicates": ["biolink:treats"],
+            },
+        },
+    }
+
+
+def symmetric(pinned: str) -> Dict:
+    """Get interactors of a pinned node, in either direction."""
+    return {
+        "nodes": {"n0": {}, "n1": {"ids": [pinned]}},
+        "edges": {
+            "e01": {
+                "subject": "n0",
+                "object": "n1",
+                "predicates": ["biolink:interacts_with"],
+            },
+        },
+    }
+
+
+# name -> query graph factory
+# "bind" re-binds the one-hop answer through the router's bind operation
+QUERIES: Dict[str, Callable[[str], Dict]] = {
+    "one_hop": one_hop,
+    "two_hop": two_hop,
+    "star": star,
+    "loop": loop,
+    "symmetric": symmetric,
+    "bind": one_hop,
+}
+
+
+def catalog(pinned: str, names: List[str] = None) -> Dict[str, Dict]:
+    """Get query graphs by name."""
+    return {
+        name: factory(pinned)
+        for name, factory in QUERIES.items()
+        if names is None or name in names
+    }
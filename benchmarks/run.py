@@ -0,0 +1,243 @@
+"""Run benchmarks and report JSON.
+
+Examples:
+    python -m benchmarks.run --nodes 100000 --edges 500000 --output base.json
+    python -m benchmarks.run --nodes 100000 --edges 500000 \
+        --baseline base.json --max-regression 1.25
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+import httpx
+
+from binder.engine import KnowledgeProvider
+from binder.metrics import QueryMetrics
+from binder.pool import ConnectionPool
+from binder.router import kp_router
+
+from .generate import build_database, generate_graph, GraphSpec
+from .queries import catalog, QUERIES
+
+# (metrics, number of results) of one run
+Run = Tuple[Optional[QueryMetrics], int]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Get nearest-rank percentile of values."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def measure(run: Callable[[], Awaitable[Run]], repeat: int) -> Dict[str, Any]:
+    """Time repeated runs, after one warm-up, then trace peak memory of one."""
+    await run()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        metrics, num_results = await run()
+        latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        await run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    report = {
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p90_ms": percentile(latencies, 0.9) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "peak_memory_kib": peak / 1024,
+        "results": num_results,
+    }
+    if metrics is not None:
+        report["sql_statements"] = metrics.counts["sql_statements"]
+        report["rows"] = metrics.counts["rows"]
+    return report
+
+
+def kp_run(pool: ConnectionPool, qgraph: Dict, strategy: str):
+    """Get function answering query graph with a knowledge provider."""
+
+    async def run() -> Run:
+        metrics = QueryMetrics()
+        async with KnowledgeProvider(
+            pool.database_file, strategy=strategy, metrics=metrics, pool=pool
+        ) as kp:
+            _, results = await kp.get_results(qgraph)
+        return metrics, len(results)
+
+    return run
+
+
+def router_run(client: httpx.AsyncClient, request: Dict):
+    """Get function answering request through the router."""
+
+    async def run() -> Run:
+        response = await client.post("/query", json=request)
+        response.raise_for_status()
+        return None, len(response.json()["message"]["results"])
+
+    return run
+
+
+async def run_benchmarks(
+    database_file: str,
+    pinned: str,
+    repeat: int = 10,
+    names: Optional[List[str]] = None,
+    pool_size: int = 4,
+) -> Dict[str, Dict]:
+    """Run query catalog against the providers and the router.
+
+    Both share a pool of pool_size connections.
+    """
+    reports = dict()
+    pool = ConnectionPool(database_file, size=pool_size)
+    app = FastAPI()
+    app.include_router(kp_router(pool))
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://kp") as client:
+            for name, qgraph in catalog(pinned, names).items():
+                report = reports[name] = dict()
+                if name == "bind":
+                    response = await client.post(
+                        "/query", json={"message": {"query_graph": qgraph}}
+                    )
+                    response.raise_for_status()
+                    request = {
+                        "message": {
+                            "query_graph": qgraph,
+                            "knowledge_graph": response.json()["message"][
+                                "knowledge_graph"
+                            ],
+                        },
+                        "workflow": [{"id": "bind"}],
+                    }
+                    report["router"] = await measure(
+                        router_run(client, request), repeat
+                    )
+                    continue
+                for strategy in ("join", "recursive", "frontier"):
+                    report[f"kp_{strategy}"] = await measure(
+                        kp_run(pool, qgraph, strategy), repeat
+                    )
+                report["router"] = await measure(
+                    router_run(client, {"message": {"query_graph": qgraph}}),
+                    repeat,
+                )
+    finally:
+        await pool.close()
+    return reports
+
+
+def compare(report: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """Get p50 latency regressions beyond max_regression times the baseline."""
+    if report["spec"] != baseline["spec"]:
+        print("warning: graph specs differ from baseline", file=sys.stderr)
+    regressions = []
+    for name, modes in report["queries"].items():
+        for mode, measurements in modes.items():
+            before = baseline["queries"].get(name, dict()).get(mode, None)
+            if before is None or not before["p50_ms"]:
+                continue
+            ratio = measurements["p50_ms"] / before["p50_ms"]
+            print(f"{name}/{mode}: {ratio:.2f}x baseline p50")
+            if ratio > max_regression:
+                regressions.append(f"{name}/{mode}")
+    return regressions
+
+
+async def benchmark(
+    spec: GraphSpec,
+    database_file: str,
+    repeat: int = 10,
+    pin_rank: int = 10,
+    names: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Build database, if needed, and benchmark it."""
+    if os.path.exists(database_file):
+        # generation is deterministic, so this finds the same nodes
+        nodes, _ = generate_graph(spec)
+    else:
+        nodes, _ = await build_database(database_file, spec)
+    # nodes are ordered by popularity
+    pinned = nodes[min(pin_rank, len(nodes) - 1)]["id"]
+    return {
+        "spec": spec.as_dict(),
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "repeat": repeat,
+        "pinned": pinned,
+        "queries": await run_benchmarks(database_file, pinned, repeat, names),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--edges", type=int, default=5000)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--pin-rank",
+        type=int,
+        default=10,
+        help="popularity rank of the pinned node (0 is the biggest hub)",
+    )
+    parser.add_argument(
+        "--queries", nargs="+", choices=list(QUERIES), help="query shapes to run"
+    )
+    parser.add_argument(
+        "--database", help="database file, generated if it does not exist"
+    )
+    parser.add_argument("--output", help="write JSON report to file")
+    parser.add_argument("--baseline", help="compare with JSON report")
+    parser.add_argument("--max-regression", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    spec = GraphSpec(
+        num_nodes=args.nodes,
+        num_edges=args.edges,
+        skew=args.skew,
+        seed=args.seed,
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_file = args.database or os.path.join(tmpdir, "benchmark.db")
+        report = asyncio.run(
+            benchmark(spec, database_file, args.repeat, args.pin_rank, args.queries)
+        )
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as stream:
+            stream.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline, "r") as stream:
+            baseline = json.load(stream)
+        regressions = compare(report, baseline, args.max_regression)
+        if regressions:
+            print(f"regressions: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
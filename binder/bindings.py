@@ -0,0 +1,292 @@
+"""Tables of partial results."""
+from array import array
+from collections import defaultdict
+import itertools
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+# array type code of interned ids
+TYPECODE = "q"
+
+
+class Interner:
+    """Two-way mapping between strings and consecutive integers."""
+
+    def __init__(self):
+        """Initialize."""
+        self.ids: Dict[str, int] = dict()
+        self.strings: List[str] = []
+
+    def __call__(self, string: str) -> int:
+        """Get integer for string, assigning the next one if it is new."""
+        idx = self.ids.get(string, None)
+        if idx is None:
+            idx = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return idx
+
+    def __len__(self):
+        """Count strings."""
+        return len(self.strings)
+
+
+class BindingTable:
+    """Partial results, as one column of interned ids per qnode and qedge.
+
+    Row i of every column together make up result i. TRAPI results are
+    built only when asked for, by results().
+    """
+
+    def __init__(
+        self,
+        interner: Interner,
+        node_columns: Optional[Dict[str, array]] = None,
+        edge_columns: Optional[Dict[str, array]] = None,
+        length: int = 1,
+    ):
+        """Initialize.
+
+        The default table has one empty row, which joins with anything.
+        """
+        self.interner = interner
+        self.node_columns = node_columns or dict()
+        self.edge_columns = edge_columns or dict()
+        self.length = length
+
+    @classmethod
+    def empty(cls, interner: Interner) -> "BindingTable":
+        """Get table without rows."""
+        return cls(interner, length=0)
+
+    @classmethod
+    def from_rows(
+        cls,
+        interner: Interner,
+        qnode_ids: Sequence[str],
+        qedge_ids: Sequence[str],
+        rows: Sequence[Sequence[str]],
+    ) -> "BindingTable":
+        """Get table of rows holding qnode ids, then qedge ids."""
+        columns = [array(TYPECODE, map(interner, column)) for column in zip(*rows)]
+        if not columns:
+            columns = [array(TYPECODE) for _ in range(len(qnode_ids) + len(qedge_ids))]
+        return cls(
+            interner,
+            dict(zip(qnode_ids, columns)),
+            dict(zip(qedge_ids, columns[len(qnode_ids) :])),
+            len(rows),
+        )
+
+    def __len__(self):
+        """Count rows."""
+        return self.length
+
+    def values(self, qnode_id: str) -> Set[str]:
+        """Get the ids bound to qnode."""
+        strings = self.interner.strings
+        return {strings[idx] for idx in set(self.node_columns[qnode_id])}
+
+    def edge_ids(self) -> Set[str]:
+        """Get the kedge ids bound in any row."""
+        strings = self.interner.strings
+        return {
+            strings[idx] for column in self.edge_columns.values() for idx in set(column)
+        }
+
+    def _take(self, rows: Sequence[int]) -> Tuple[Dict, Dict]:
+        """Get node and edge columns of rows."""
+        return (
+            {
+                qnode_id: array(TYPECODE, [column[row] for row in rows])
+                for qnode_id, column in self.node_columns.items()
+            },
+            {
+                qedge_id: array(TYPECODE, [column[row] for row in rows])
+                for qedge_id, column in self.edge_columns.items()
+            },
+        )
+
+    def head(self, limit: Optional[int]) -> "BindingTable":
+        """Get table of the first limit rows, or all."""
+        if limit is None or limit >= self.length:
+            return self
+        return BindingTable(
+            self.interner,
+            {
+                qnode_id: column[:limit]
+                for qnode_id, column in self.node_columns.items()
+            },
+            {
+                qedge_id: column[:limit]
+                for qedge_id, column in self.edge_columns.items()
+            },
+            limit,
+        )
+
+    def bind(self, nodes: Dict[str, str], edges: Dict[str, str]) -> "BindingTable":
+        """Get table with qnodes and qedges bound to the same ids in all rows."""
+        node_columns = dict(self.node_columns)
+        for qnode_id, knode_id in nodes.items():
+            node_columns[qnode_id] = (
+                array(TYPECODE, [self.interner(knode_id)]) * self.length
+            )
+        edge_columns = dict(self.edge_columns)
+        for qedge_id, kedge_id in edges.items():
+            edge_columns[qedge_id] = (
+                array(TYPECODE, [self.interner(kedge_id)]) * self.length
+            )
+        return BindingTable(self.interner, node_columns, edge_columns, self.length)
+
+    def join(
+        self,
+        qedge_id: str,
+        subject: str,
+        object: str,
+        matches: Iterable[Tuple[str, str, str]],
+        limit: Optional[int] = None,
+    ) -> "BindingTable":
+        """Extend rows with matching (subject id, object id, kedge id).
+
+        Rows and matches are paired by hash join on the ids of the qnodes
+        already bound. If limit is given, only the first limit rows of the
+        result are built.
+        """
+        intern = self.interner
+        matches = [
+            (intern(subject_id), intern(object_id), intern(kedge_id))
+            for subject_id, object_id, kedge_id in matches
+        ]
+        if subject == object:
+            matches = [match for match in matches if match[0] == match[1]]
+            qnode_ids = (subject,)
+        else:
+            qnode_ids = (subject, object)
+        # positions in matches of the qnodes already bound, and not
+        shared = [
+            (idx, self.node_columns[qnode_id])
+            for idx, qnode_id in enumerate(qnode_ids)
+            if qnode_id in self.node_columns
+        ]
+        new = [
+            (idx, qnode_id)
+            for idx, qnode_id in enumerate(qnode_ids)
+            if qnode_id not in self.node_columns
+        ]
+
+        index = defaultdict(list)
+        for match in matches:
+            index[tuple(match[idx] for idx, _ in shared)].append(match)
+        rows = array(TYPECODE)
+        extensions = []
+        for row in range(self.length):
+            if limit is not None and len(rows) >= limit:
+                break
+            found = index.get(tuple(column[row] for _, column in shared), ())
+            rows.extend([row] * len(found))
+            extensions.extend(found)
+        if limit is not None:
+            del rows[limit:]
+            del extensions[limit:]
+
+        node_columns, edge_columns = self._take(rows)
+        for idx, qnode_id in new:
+            node_columns[qnode_id] = array(
+                TYPECODE, [match[idx] for match in extensions]
+            )
+        edge_columns[qedge_id] = array(TYPECODE, [match[2] for match in extensions])
+        return BindingTable(self.interner, node_columns, edge_columns, len(rows))
+
+    @classmethod
+    def concat(
+        cls, interner: Interner, tables: Iterable["BindingTable"]
+    ) -> "BindingTable":
+        """Stack the rows of tables binding the same qnodes and qedges."""
+        tables = [table for table in tables if table.length]
+        if not tables:
+            return cls.empty(interner)
+        node_columns = {
+            qnode_id: array(TYPECODE) for qnode_id in tables[0].node_columns
+        }
+        edge_columns = {
+            qedge_id: array(TYPECODE) for qedge_id in tables[0].edge_columns
+        }
+        for table in tables:
+            for qnode_id, column in node_columns.items():
+                column.extend(table.node_columns[qnode_id])
+            for qedge_id, column in edge_columns.items():
+                column.extend(table.edge_columns[qedge_id])
+        return cls(
+            interner,
+            node_columns,
+            edge_columns,
+            sum(table.length for table in tables),
+        )
+
+    @classmethod
+    def product(
+        cls,
+        interner: Interner,
+        tables: Sequence["BindingTable"],
+        limit: Optional[int] = None,
+    ) -> "BindingTable":
+        """Combine every row of each table with every row of the others.
+
+        Only the first limit combinations are kept, if given.
+        """
+        total = 1
+        for table in tables:
+            total *= table.length
+        length = total if limit is None else min(total, limit)
+        node_columns = dict()
+        edge_columns = dict()
+        # rows of later tables vary fastest
+        stride = total
+        for table in tables:
+            stride //= table.length or 1
+            for columns, table_columns in (
+                (node_columns, table.node_columns),
+                (edge_columns, table.edge_columns),
+            ):
+                for key, column in table_columns.items():
+                    # each id repeated stride times, then all tiled
+                    block = array(
+                        TYPECODE,
+                        itertools.islice(
+                            itertools.chain.from_iterable(
+                                itertools.repeat(idx, stride) for idx in column
+                            ),
+                            length,
+                        ),
+                    )
+                    if block:
+                        block *= -(-length // len(block))
+                    columns[key] = block[:length]
+        return cls(interner, node_columns, edge_columns, length)
+
+    def iter_results(self) -> Iterator[Dict]:
+        """Generate TRAPI results.
+
+        Results binding the same id share its binding list, as results
+        extended from the same partial result did before.
+        """
+        strings = self.interner.strings
+        bindings = dict()
+        for column in itertools.chain(
+            self.node_columns.values(), self.edge_columns.values()
+        ):
+            for idx in set(column).difference(bindings):
+                bindings[idx] = [{"id": strings[idx]}]
+        nodes = list(self.node_columns.items())
+        edges = list(self.edge_columns.items())
+        for row in range(self.length):
+            yield {
+                "node_bindings": {
+                    qnode_id: bindings[column[row]] for qnode_id, column in nodes
+                },
+                "edge_bindings": {
+                    qedge_id: bindings[column[row]] for qedge_id, column in edges
+                },
+            }
+
+    def results(self, limit: Optional[int] = None) -> List[Dict]:
+        """Get TRAPI results of the first limit rows, or all."""
+        return list(self.head(limit).iter_results())
@@ -1,9 +1,20 @@
 """Data I/O."""
+import argparse
+import asyncio
+import csv
+import gzip
+import itertools
+import json
+import logging
 import re
+import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
 import uuid
 
 import aiosqlite
 
+LOGGER = logging.getLogger(__name__)
+
 
 async def get_data_from_string(data: str):
     """Get data from string.
@@ -76,25 +87,342 @@ async def add_data(
     connection: aiosqlite.Connection,
     nodes,
     edges,
+    without_rowid: bool = False,
 ):
+    """Add nodes and edges to SQLite database.
+
+    Tables are created on first use, keyed by id.
+    Rows whose id is already present are skipped.
+    """
     if nodes:
-        await connection.execute(
-            "CREATE TABLE IF NOT EXISTS nodes ({0})".format(
-                ", ".join([f"{val} text" for val in nodes[0]])
-            )
-        )
+        await create_table(connection, "nodes", nodes[0], without_rowid)
         await connection.executemany(
-            "INSERT INTO nodes VALUES ({0})".format(", ".join(["?" for _ in nodes[0]])),
+            "INSERT OR IGNORE INTO nodes VALUES ({0})".format(
+                ", ".join(["?" for _ in nodes[0]])
+            ),
             [list(node.values()) for node in nodes],
         )
     if edges:
-        await connection.execute(
-            "CREATE TABLE IF NOT EXISTS edges ({0})".format(
-                ", ".join([f"{val} text" for val in edges[0]])
-            )
-        )
+        await create_table(connection, "edges", edges[0], without_rowid)
         await connection.executemany(
-            "INSERT INTO edges VALUES ({0})".format(", ".join(["?" for _ in edges[0]])),
+            "INSERT OR IGNORE INTO edges VALUES ({0})".format(
+                ", ".join(["?" for _ in edges[0]])
+            ),
             [list(edge.values()) for edge in edges],
         )
     await connection.commit()
+    await prepare_db(connection)
+
+
+async def create_table(
+    connection: aiosqlite.Connection,
+    table: str,
+    columns,
+    without_rowid: bool = False,
+    primary_key: bool = True,
+):
+    """Create table, if it does not exist, with a text primary key on id."""
+    if without_rowid and not primary_key:
+        raise ValueError("WITHOUT ROWID tables need a primary key")
+    await connection.execute(
+        "CREATE TABLE IF NOT EXISTS {0} ({1}){2}".format(
+            table,
+            ", ".join(
+                [
+                    f"{column} text PRIMARY KEY"
+                    if column == "id" and primary_key
+                    else f"{column} text"
+                    for column in columns
+                ]
+            ),
+            " WITHOUT ROWID" if without_rowid else "",
+        )
+    )
+
+
+# edge indexes, covering the columns a join reads from either end
+EDGE_INDEXES = {
+    "edges_subject_predicate": ("subject", "predicate", "object"),
+    "edges_object_predicate": ("object", "predicate", "subject"),
+}
+
+
+async def prepare_db(connection: aiosqlite.Connection):
+    """Create indexes and gather statistics for the query planner.
+
+    This is safe to run on existing databases, including ones built
+    before the tables had primary keys. Rows of such tables that repeat
+    an id are dropped, keeping the first.
+    """
+    tables = await _fetch_column(
+        connection,
+        "SELECT name FROM sqlite_master WHERE type = 'table'",
+    )
+    for table in ("nodes", "edges"):
+        if table not in tables:
+            continue
+        primary_key = await _fetch_column(
+            connection,
+            f"SELECT name FROM pragma_table_info('{table}') WHERE pk > 0",
+        )
+        if primary_key == ["id"]:
+            continue
+        unique = await _fetch_column(
+            connection,
+            'SELECT "unique" FROM pragma_index_list(?) WHERE name = ?',
+            [table, f"{table}_id"],
+        )
+        if unique != [1]:
+            # keep the first row of each id, as a primary key would have
+            await connection.execute(
+                f"DELETE FROM {table} WHERE rowid NOT IN "
+                f"(SELECT MIN(rowid) FROM {table} GROUP BY id)"
+            )
+            await connection.execute(f"DROP INDEX IF EXISTS {table}_id")
+            await connection.execute(f"CREATE UNIQUE INDEX {table}_id ON {table} (id)")
+    if "edges" in tables:
+        for index, columns in EDGE_INDEXES.items():
+            existing = await _fetch_column(
+                connection,
+                "SELECT name FROM pragma_index_info(?) ORDER BY seqno",
+                [index],
+            )
+            if existing == list(columns):
+                continue
+            # replace indexes of older databases, which did not cover joins
+            await connection.execute(f"DROP INDEX IF EXISTS {index}")
+            await connection.execute(
+                f"CREATE INDEX {index} ON edges ({', '.join(columns)})"
+            )
+    await build_metadata(connection, tables)
+    await connection.execute("ANALYZE")
+    await connection.commit()
+
+
+OPERATIONS_SQL = (
+    "SELECT DISTINCT subject.category AS subject_category, "
+    "edge.predicate AS predicate, object.category AS object_category "
+    "FROM edges AS edge "
+    "JOIN nodes AS subject ON edge.subject = subject.id "
+    "JOIN nodes AS object ON edge.object = object.id"
+)
+PREFIXES_SQL = (
+    "SELECT DISTINCT category, "
+    "CASE WHEN instr(id, ':') > 0 THEN substr(id, 1, instr(id, ':') - 1) "
+    "ELSE id END AS prefix "
+    "FROM nodes"
+)
+PREDICATE_COUNTS_SQL = (
+    "SELECT predicate, COUNT(*) AS count FROM edges GROUP BY predicate"
+)
+CATEGORY_COUNTS_SQL = "SELECT category, COUNT(*) AS count FROM nodes GROUP BY category"
+
+
+async def build_metadata(connection: aiosqlite.Connection, tables=None):
+    """Persist meta knowledge graph summaries.
+
+    meta_operations holds the distinct (subject category, predicate,
+    object category) triples and meta_prefixes the distinct
+    (category, CURIE prefix) pairs. meta_predicate_counts and
+    meta_category_counts hold the number of edges per predicate and nodes
+    per category, for query planning. They are rebuilt from scratch.
+    """
+    if tables is None:
+        tables = await _fetch_column(
+            connection,
+            "SELECT name FROM sqlite_master WHERE type = 'table'",
+        )
+    if "nodes" in tables and "edges" in tables:
+        await connection.execute("DROP TABLE IF EXISTS meta_operations")
+        await connection.execute(f"CREATE TABLE meta_operations AS {OPERATIONS_SQL}")
+    if "nodes" in tables:
+        await connection.execute("DROP TABLE IF EXISTS meta_prefixes")
+        await connection.execute(f"CREATE TABLE meta_prefixes AS {PREFIXES_SQL}")
+        await connection.execute("DROP TABLE IF EXISTS meta_category_counts")
+        await connection.execute(
+            f"CREATE TABLE meta_category_counts AS {CATEGORY_COUNTS_SQL}"
+        )
+    if "edges" in tables:
+        await connection.execute("DROP TABLE IF EXISTS meta_predicate_counts")
+        await connection.execute(
+            f"CREATE TABLE meta_predicate_counts AS {PREDICATE_COUNTS_SQL}"
+        )
+
+
+NODE_COLUMNS = ("id", "category")
+EDGE_COLUMNS = ("id", "subject", "predicate", "object")
+
+
+def _open_text(filename: str):
+    """Open (possibly gzipped) text file."""
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "rt", newline="")
+    return open(filename, "r", newline="")
+
+
+def read_records(filename: str) -> Iterator[Dict]:
+    """Read records from KGX-style TSV or JSON Lines file, one at a time."""
+    stem = filename[:-3] if filename.endswith(".gz") else filename
+    with _open_text(filename) as stream:
+        if stem.endswith((".jsonl", ".ndjson")):
+            for line in stream:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        elif stem.endswith(".tsv"):
+            yield from csv.DictReader(stream, delimiter="\t")
+        else:
+            raise ValueError(f"Unrecognized file format '{filename}'")
+
+
+def _first(value):
+    """Get first of list or |-delimited values."""
+    if isinstance(value, list):
+        return value[0] if value else None
+    if isinstance(value, str):
+        return value.split("|")[0]
+    return value
+
+
+def _node_row(record: Dict) -> Tuple:
+    """Get nodes row from KGX node record."""
+    category = record.get("category", None) or record.get("categories", None)
+    return (record["id"], _first(category) or "biolink:NamedThing")
+
+
+def _edge_row(record: Dict) -> Tuple:
+    """Get edges row from KGX edge record."""
+    return (
+        record.get("id", None) or str(uuid.uuid4()),
+        record["subject"],
+        record["predicate"],
+        record["object"],
+    )
+
+
+async def _load_rows(
+    connection: aiosqlite.Connection,
+    table: str,
+    columns: Tuple[str, ...],
+    rows: Iterable[Tuple],
+    chunk_size: int,
+) -> int:
+    """Insert rows in chunks, one transaction per chunk."""
+    sql = "INSERT OR IGNORE INTO {0} ({1}) VALUES ({2})".format(
+        table, ", ".join(columns), ", ".join("?" for _ in columns)
+    )
+    start = time.perf_counter()
+    count = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        await connection.executemany(sql, chunk)
+        await connection.commit()
+        count += len(chunk)
+        elapsed = time.perf_counter() - start
+        LOGGER.info(
+            "Loaded %d %s (%.0f rows/s)", count, table, count / max(elapsed, 1e-9)
+        )
+    return count
+
+
+async def load_files(
+    connection: aiosqlite.Connection,
+    nodes_file: Optional[str] = None,
+    edges_file: Optional[str] = None,
+    chunk_size: int = 100_000,
+) -> Dict[str, int]:
+    """Stream nodes and edges from KGX-style files into SQLite database.
+
+    Files may be TSV or JSON Lines, optionally gzipped. Only the columns
+    used by the engine are kept, and the first category of each node.
+    Journaling is disabled during the load and indexes are created at
+    the end, so tables created here have no primary key; rows repeating
+    an id are dropped then, keeping the first.
+    """
+    await connection.execute("PRAGMA journal_mode = OFF")
+    await connection.execute("PRAGMA synchronous = OFF")
+    counts = {"nodes": 0, "edges": 0}
+    try:
+        if nodes_file is not None:
+            await create_table(connection, "nodes", NODE_COLUMNS, primary_key=False)
+            counts["nodes"] = await _load_rows(
+                connection,
+                "nodes",
+                NODE_COLUMNS,
+                map(_node_row, read_records(nodes_file)),
+                chunk_size,
+            )
+        if edges_file is not None:
+            await create_table(connection, "edges", EDGE_COLUMNS, primary_key=False)
+            counts["edges"] = await _load_rows(
+                connection,
+                "edges",
+                EDGE_COLUMNS,
+                map(_edge_row, read_records(edges_file)),
+                chunk_size,
+            )
+    finally:
+        await connection.execute("PRAGMA synchronous = FULL")
+        await connection.execute("PRAGMA journal_mode = DELETE")
+    await prepare_db(connection)
+    return counts
+
+
+async def _fetch_column(connection: aiosqlite.Connection, sql: str, parameters=()):
+    """Fetch the first column of all rows, regardless of row factory."""
+    async with connection.execute(sql, parameters) as cursor:
+        rows = await cursor.fetchall()
+    return [
+        next(iter(row.values())) if isinstance(row, dict) else row[0] for row in rows
+    ]
+
+
+async def _prepare_file(database_file: str):
+    """Prepare database file."""
+    async with aiosqlite.connect(database_file) as connection:
+        await prepare_db(connection)
+
+
+async def _load_file(database_file: str, **kwargs):
+    """Load KGX-style files into database file."""
+    async with aiosqlite.connect(database_file) as connection:
+        await load_files(connection, **kwargs)
+
+
+def main(argv=None):
+    """Run build_db command-line interface."""
+    parser = argparse.ArgumentParser(description="Build binder databases.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    prepare_parser = subparsers.add_parser(
+        "prepare",
+        help="create indexes and gather statistics for an existing database",
+    )
+    prepare_parser.add_argument("database_file")
+    load_parser = subparsers.add_parser(
+        "load",
+        help="stream KGX-style TSV or JSON Lines files into a database",
+    )
+    load_parser.add_argument("database_file")
+    load_parser.add_argument("--nodes", dest="nodes_file")
+    load_parser.add_argument("--edges", dest="edges_file")
+    load_parser.add_argument("--chunk-size", type=int, default=100_000)
+    args = parser.parse_args(argv)
+    if args.command == "prepare":
+        asyncio.run(_prepare_file(args.database_file))
+    elif args.command == "load":
+        logging.basicConfig(level=logging.INFO)
+        asyncio.run(
+            _load_file(
+                args.database_file,
+                nodes_file=args.nodes_file,
+                edges_file=args.edges_file,
+                chunk_size=args.chunk_size,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
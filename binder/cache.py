@@ -0,0 +1,106 @@
+"""Caches."""
+from collections import OrderedDict
+import time
+from typing import Any, Callable, Hashable, Optional
+
+
+class Memo:
+    """Least-recently-used memo table with hit/miss counters."""
+
+    def __init__(self, maxsize: Optional[int] = 4096):
+        """Initialize.
+
+        maxsize=None means unbounded.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        """Count entries."""
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get value, counting the hit or miss."""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        """Store value, evicting the least recently used entry if full."""
+        if self.maxsize == 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if self.maxsize is not None and len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class ResultCache:
+    """Least-recently-used cache bounded in entries, bytes, and age.
+
+    Entries older than ttl seconds are dropped when next looked up.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        maxbytes: int = 2**27,
+        ttl: Optional[float] = 300.0,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize."""
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.timer = timer
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        # key -> (expiry time, size in bytes, value)
+        self._data = OrderedDict()
+
+    def __len__(self):
+        """Count entries."""
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get value, counting the hit or miss."""
+        entry = self._data.get(key, None)
+        if entry is not None and entry[0] is not None and entry[0] <= self.timer():
+            self._pop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, key: Hashable, value: Any, size: int):
+        """Store value of the given size, evicting entries to make room."""
+        if key in self._data:
+            self._pop(key)
+        if self.maxsize <= 0 or size > self.maxbytes:
+            return
+        expiry = None if self.ttl is None else self.timer() + self.ttl
+        self._data[key] = (expiry, size, value)
+        self.nbytes += size
+        while len(self._data) > self.maxsize or self.nbytes > self.maxbytes:
+            self._pop(next(iter(self._data)))
+
+    def clear(self):
+        """Drop all entries."""
+        self._data.clear()
+        self.nbytes = 0
+
+    def _pop(self, key: Hashable):
+        """Drop entry."""
+        _, size, _ = self._data.pop(key)
+        self.nbytes -= size
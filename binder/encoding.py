@@ -0,0 +1,47 @@
+"""TRAPI response serialization."""
+import json
+from typing import Any, Dict, Tuple
+
+from fastapi.encoders import jsonable_encoder
+import fastapi.responses
+from reasoner_pydantic import Response
+
+
+def _json_members(obj: Dict[str, Any]) -> bytes:
+    """Serialize JSON object without its enclosing braces."""
+    return json.dumps(obj)[1:-1].encode()
+
+
+def encode_response(response: Response) -> Tuple[bytes, bytes]:
+    """Serialize response, except for its query graph.
+
+    Returns the remaining members of the message and of the response.
+    """
+    encoded = jsonable_encoder(response, by_alias=True)
+    message = encoded.pop("message")
+    message.pop("query_graph", None)
+    return _json_members(message), _json_members(encoded)
+
+
+def encode_query_graph(query_graph: Any) -> bytes:
+    """Serialize query graph model."""
+    return json.dumps(jsonable_encoder(query_graph, by_alias=True)).encode()
+
+
+def encoded_response(
+    query_graph: Any,
+    encoded: Tuple[bytes, bytes],
+) -> fastapi.responses.Response:
+    """Build response from query graph and serialized remainder."""
+    message_members, response_members = encoded
+    query_graph = encode_query_graph(query_graph)
+    message_members = [b'"query_graph": ' + query_graph] + (
+        [message_members] if message_members else []
+    )
+    members = [b'"message": {' + b", ".join(message_members) + b"}"] + (
+        [response_members] if response_members else []
+    )
+    return fastapi.responses.Response(
+        content=b"{" + b", ".join(members) + b"}",
+        media_type="application/json",
+    )
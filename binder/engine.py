@@ -1,26 +1,69 @@
 """SQL query graph engine."""
+import asyncio
 from collections import defaultdict
 import copy
-import itertools
+from datetime import datetime, timezone
 import logging
 import os
 import re
 import sqlite3
-from typing import Any, Dict, Optional, Tuple, Union
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import aiosqlite
 
-from .graph import Graph
+from ._contextlib import asynccontextmanager
+from .bindings import BindingTable, Interner
+from .build_db import OPERATIONS_SQL, PREFIXES_SQL
+from .cache import Memo
+from .graph import Graph, SubGraph
+from .metrics import QueryMetrics
+from .planner import is_joinable, JoinPlan
+from .pool import ConnectionPool, database_signature
+from .records import KEdge
+from .statistics import Statistics
 from .util import (
     build_conditions,
     get_subpredicates,
     is_symmetric,
+    KEY_MAP,
     NoAnswersException,
     get_subcategories,
 )
 
 LOGGER = logging.getLogger(__name__)
 
+# SQLite's historical limit of host parameters per statement
+MAX_PARAMETERS = 999
+# ids per IN (...) list, to bound the work of each statement
+MAX_VARIABLES = 500
+# rows read from a cursor at a time
+FETCH_SIZE = 1024
+# table statistics by database signature, shared by providers
+_STATISTICS = Memo(16)
+
+
+def custom_row_factory(cursor, row):
+    """
+    Convert row to dictionary and
+    convert some of the fields to lists
+    """
+    row_output = {}
+    for idx, col in enumerate(cursor.description):
+        row_output[col[0]] = row[idx]
+
+    return row_output
+
 
 def normalize_qgraph(qgraph):
     """Normalize query graph."""
@@ -39,23 +82,19 @@ def normalize_qgraph(qgraph):
         ]
 
 
-def custom_row_factory(cursor, row):
-    """
-    Convert row to dictionary and
-    convert some of the fields to lists
-    """
-    row_output = {}
-    for idx, col in enumerate(cursor.description):
-        row_output[col[0]] = row[idx]
+def _expired(deadline: Optional[float]) -> bool:
+    """Determine whether deadline, if any, has passed."""
+    return deadline is not None and time.monotonic() >= deadline
 
-    return row_output
 
+def prepare_qgraph(qgraph: Dict[str, Any]) -> Graph:
+    """Get normalized copy of query graph."""
+    qgraph = Graph(copy.deepcopy(qgraph))
+    normalize_qgraph(qgraph)
+    return qgraph
 
-KEY_MAP = {
-    "predicates": "predicate",
-    "categories": "category",
-    "ids": "id",
-}
+
+STRATEGIES = ("join", "recursive", "frontier")
 
 
 class KnowledgeProvider:
@@ -65,8 +104,30 @@ class KnowledgeProvider:
         self,
         arg: Union[str, aiosqlite.Connection] = ":memory:",
         name: Optional[str] = None,
+        strategy: str = "join",
+        memo_size: Optional[int] = 4096,
+        cached_statements: int = 256,
+        metrics: Optional[QueryMetrics] = None,
+        pool: Optional[ConnectionPool] = None,
     ):
-        """Initialize."""
+        """Initialize.
+
+        strategy: one of STRATEGIES, described in the README.
+        memo_size: sub-problem solutions kept per recursive lookup.
+        cached_statements: prepared statements cached per connection.
+        metrics: records timings and counts, if given.
+        pool: lends idle connections to independent parts of a query.
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"strategy should be one of {STRATEGIES}")
+        self.strategy = strategy
+        self.memo_size = memo_size
+        self.cached_statements = cached_statements
+        self._statistics = None
+        # TRAPI log entries of the queries run
+        self.logs = []
+        self.metrics = QueryMetrics() if metrics is None else metrics
+        self.pool = pool
         if isinstance(arg, str):
             self.database_file = arg
             self.name = os.path.splitext(os.path.basename(self.database_file))[0]
@@ -75,7 +136,6 @@ class KnowledgeProvider:
             self.database_file = None
             self.name = None
             self.db = arg
-            self.db.row_factory = custom_row_factory
         else:
             raise ValueError("arg should be of type str or aiosqlite.Connection")
         if name is not None:
@@ -85,7 +145,9 @@ class KnowledgeProvider:
         """Enter context."""
         if self.db is not None:
             return self
-        self.db = await aiosqlite.connect(self.database_file)
+        self.db = await aiosqlite.connect(
+            self.database_file, cached_statements=self.cached_statements
+        )
         self.db.row_factory = custom_row_factory
         return self
 
@@ -97,59 +159,129 @@ class KnowledgeProvider:
         self.db = None
         await tmp_db.close()
 
-    async def get_operations(self):
-        """Get operations."""
-        async with self.db.execute(
-            "SELECT * FROM edges",
-        ) as cursor:
-            edges = await cursor.fetchall()
+    async def _cursor(self, sql: str, parameters: Iterable = ()) -> aiosqlite.Cursor:
+        """Execute query, returning a cursor that reads rows as sqlite3.Row.
 
-        async with self.db.execute(
-            "SELECT * FROM nodes",
+        The connection's row factory, which callers sharing it may rely
+        on, is left as it is.
+        """
+        cursor = await self.db.execute(sql, parameters)
+        # aiosqlite does not expose the row factory of cursors
+        cursor._cursor.row_factory = sqlite3.Row
+        return cursor
+
+    @asynccontextmanager
+    async def _execute(self, sql: str, parameters: Iterable = ()):
+        """Execute query, closing its cursor on exit."""
+        cursor = await self._cursor(sql, parameters)
+        try:
+            yield cursor
+        finally:
+            await cursor.close()
+
+    async def _has_table(self, table: str) -> bool:
+        """Determine whether table exists."""
+        async with self._execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+            [table],
         ) as cursor:
-            nodes = await cursor.fetchall()
-        nodes = {node["id"]: node for node in nodes}
-
-        ops = set()
-        for edge in edges:
-            subject_node = nodes[edge["subject"]]
-            object_node = nodes[edge["object"]]
-
-            operation_iterator = itertools.product(
-                [subject_node["category"]],
-                [edge["predicate"]],
-                [object_node["category"]],
-            )
+            return await cursor.fetchone() is not None
 
-            ops.update(operation_iterator)
+    async def get_operations(self):
+        """Get operations.
 
-        return [
-            {
-                "subject_category": op[0],
-                "predicate": op[1],
-                "object_category": op[2],
-            }
-            for op in ops
-        ]
+        These are read from the meta_operations table written at build
+        time, if present, or else aggregated from the edges and nodes.
+        """
+        if await self._has_table("meta_operations"):
+            sql = (
+                "SELECT subject_category, predicate, object_category "
+                "FROM meta_operations"
+            )
+        else:
+            sql = OPERATIONS_SQL
+        async with self._execute(sql) as cursor:
+            return [dict(row) for row in await cursor.fetchall()]
 
     async def get_curie_prefixes(self):
         """Get CURIE prefixes."""
-        async with self.db.execute(
-            "SELECT * FROM nodes",
-        ) as cursor:
-            nodes = await cursor.fetchall()
+        if await self._has_table("meta_prefixes"):
+            sql = "SELECT category, prefix FROM meta_prefixes"
+        else:
+            sql = PREFIXES_SQL
+        async with self._execute(sql) as cursor:
+            rows = await cursor.fetchall()
+
+        prefixes = defaultdict(list)
+        for row in rows:
+            prefixes[row["category"]].append(row["prefix"])
+        return dict(prefixes)
 
-        prefixes = defaultdict(set)
-        for node in nodes:
-            prefixes[node["category"]].add(node["id"].split(":")[0])
-        return {category: list(prefix_set) for category, prefix_set in prefixes.items()}
+    async def get_statistics(self) -> Statistics:
+        """Get table statistics for query planning.
+
+        These are read from the count tables written at build time, if
+        present, or else from sqlite_stat1, if the database was analyzed,
+        once per state of the database file.
+        """
+        if self._statistics is not None:
+            return self._statistics
+        signature = database_signature(self.pool or self.database_file)
+        if signature is not None:
+            self._statistics = _STATISTICS.get(signature)
+            if self._statistics is not None:
+                return self._statistics
+        if await self._has_table("meta_predicate_counts") and await self._has_table(
+            "meta_category_counts"
+        ):
+            async with self._execute(
+                "SELECT category, count FROM meta_category_counts"
+            ) as cursor:
+                category_counts = {
+                    row["category"]: row["count"] for row in await cursor.fetchall()
+                }
+            async with self._execute(
+                "SELECT predicate, count FROM meta_predicate_counts"
+            ) as cursor:
+                predicate_counts = {
+                    row["predicate"]: row["count"] for row in await cursor.fetchall()
+                }
+            self._statistics = Statistics(
+                num_nodes=sum(category_counts.values()),
+                num_edges=sum(predicate_counts.values()),
+                category_counts=category_counts,
+                predicate_counts=predicate_counts,
+            )
+        elif await self._has_table("sqlite_stat1"):
+            async with self._execute(
+                "SELECT tbl, idx, stat FROM sqlite_stat1 "
+                "WHERE tbl IN ('nodes', 'edges')"
+            ) as cursor:
+                rows = await cursor.fetchall()
+            self._statistics = Statistics.from_stat1(
+                (row["tbl"], row["idx"], row["stat"]) for row in rows
+            )
+        else:
+            self._statistics = Statistics()
+        if signature is not None:
+            _STATISTICS.put(signature, self._statistics)
+        return self._statistics
+
+    async def _fetchall(self, sql: str, values: Iterable) -> List:
+        """Run query, recording its time and rows in metrics."""
+        with self.metrics.timer("sql"):
+            async with self._execute(sql, values) as cursor:
+                rows = await cursor.fetchall()
+        self.metrics.count("sql_statements")
+        self.metrics.count("rows", len(rows))
+        return rows
 
     async def get_kedges(self, **kwargs):
         """Get kedges."""
         assert kwargs
         conditions, values = build_conditions(**kwargs)
         try:
-            async with self.db.execute(
+            rows = await self._fetchall(
                 (
                     "SELECT edge.id AS id, subject.id AS subject, edge.predicate as predicate, object.id as object "
                     "FROM edges AS edge "
@@ -159,8 +291,7 @@ class KnowledgeProvider:
                 + "WHERE "
                 + conditions,
                 values,
-            ) as cursor:
-                rows = await cursor.fetchall()
+            )
         except sqlite3.OperationalError as err:
             match = re.fullmatch(
                 r"no such column: (?:edge|subject|object)\.(.*)", str(err)
@@ -170,10 +301,7 @@ class KnowledgeProvider:
                 return {}
             raise
 
-        return {
-            row["id"]: {key: value for key, value in row.items() if key != "id"}
-            for row in rows
-        }
+        return {row[0]: KEdge(row[1], row[2], row[3]) for row in rows}
 
     def get_edge_constraints(
         self,
@@ -205,48 +333,229 @@ class KnowledgeProvider:
 
     async def lookup(
         self,
-        qgraph: Graph,
+        qgraph: Union[Graph, SubGraph],
+        memo: Optional[Memo] = None,
+        max_results: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        """Expand from query graph node.
+
+        Identical sub-problems are solved once, using memo if given or
+        else a fresh memo table of size memo_size. Solutions refer to ids
+        interned for this lookup, so memo should not be shared with others.
+
+        Expansion stops after max_results results or timeout seconds,
+        whichever comes first, noting the truncation in logs.
+        """
+        if not isinstance(qgraph, SubGraph):
+            qgraph = SubGraph.from_graph(qgraph)
+        if memo is None:
+            memo = Memo(self.memo_size)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        kgraph, table, complete = await self._lookup_at_most(
+            qgraph, memo, Interner(), max_results, deadline
+        )
+        LOGGER.debug("Sub-problem memo: %d hits, %d misses", memo.hits, memo.misses)
+        self.metrics.count("memo_hits", memo.hits)
+        if not complete:
+            self._log_truncation(max_results, deadline)
+            # drop kedges bound only by discarded results
+            kgraph["edges"] = {
+                kedge_id: kgraph["edges"][kedge_id] for kedge_id in table.edge_ids()
+            }
+        await self.finish_kgraph(kgraph)
+        with self.metrics.timer("materialize"):
+            results = table.results()
+        return kgraph, results
+
+    def _log_truncation(self, max_results: Optional[int], deadline: Optional[float]):
+        """Note that results are incomplete."""
+        if _expired(deadline):
+            message = "Lookup timed out; results are incomplete"
+        else:
+            message = f"Results truncated at {max_results}"
+        LOGGER.warning(message)
+        self.logs.append(
+            {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "level": "WARNING",
+                "message": message,
+            }
+        )
+
+    async def _lookup_at_most(
+        self,
+        qgraph: SubGraph,
+        memo: Memo,
+        interner: Interner,
+        limit: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ):
+        """Expand from query graph node, for at most limit results.
+
+        One more result is sought, so that finding exactly limit results
+        is not mistaken for truncation.
+        """
+        kgraph, table, complete = await self._lookup(
+            qgraph, memo, interner, None if limit is None else limit + 1, deadline
+        )
+        if limit is not None and len(table) > limit:
+            return kgraph, table.head(limit), False
+        return kgraph, table, complete
+
+    async def _lookup(
+        self,
+        qgraph: SubGraph,
+        memo: Memo,
+        interner: Interner,
+        limit: Optional[int] = None,
+        deadline: Optional[float] = None,
     ):
-        """Expand from query graph node."""
-        LOGGER.debug(f"Lookup for qgraph: {qgraph}")
+        """Expand from query graph node, binding kedges only.
+
+        Returns the kgraph, a binding table of at most limit results, and
+        whether they are complete, which they may not be if the limit was
+        reached or the deadline passed. Only complete solutions are
+        memoized.
+        """
         # if this is a leaf node, we're done
-        if not qgraph["edges"]:
-            return {"nodes": dict(), "edges": dict()}, [
-                {"node_bindings": dict(), "edge_bindings": dict()}
-            ]
-        kgraph = {"nodes": dict(), "edges": dict()}
-        results = []
+        if not qgraph.edge_ids:
+            return {"nodes": dict(), "edges": dict()}, BindingTable(interner), True
+        self.metrics.maximum("depth", len(qgraph.qedges) - len(qgraph.edge_ids))
+        signature = qgraph.signature()
+        solution = memo.get(signature)
+        if solution is not None:
+            LOGGER.debug("Reusing solution for qgraph: %s", qgraph)
+            kgraph, table = solution
+            if limit is not None and len(table) > limit:
+                return kgraph, table.head(limit), False
+            return kgraph, table, True
+        components = qgraph.components()
+        if len(components) > 1:
+            kgraph, table, complete = await self._lookup_components(
+                components, memo, interner, limit, deadline
+            )
+        else:
+            kgraph, table, complete = await self._expand(
+                qgraph, memo, interner, limit, deadline
+            )
+        if complete:
+            memo.put(signature, (kgraph, table))
+        return kgraph, table, complete
+
+    def _with_connection(self, db: aiosqlite.Connection) -> "KnowledgeProvider":
+        """Get provider sharing logs, metrics, and statistics, but using db."""
+        kp = copy.copy(self)
+        kp.db = db
+        return kp
+
+    async def _lookup_components(
+        self,
+        components: List[SubGraph],
+        memo: Memo,
+        interner: Interner,
+        limit: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ):
+        """Solve independent sub-graphs concurrently and combine results.
+
+        Each gets a connection of its own while the pool has idle ones,
+        since queries on one connection run one at a time.
+        """
+        self.metrics.maximum("components", len(components))
+        # plan on statistics read once, before any copies are made
+        await self.get_statistics()
+        connections = []
+        if self.pool is not None:
+            for _ in components[1:]:
+                db = await self.pool.try_acquire()
+                if db is None:
+                    break
+                connections.append(db)
+        kps = [self] + [self._with_connection(db) for db in connections]
         try:
-            source_qnode_id, source_qnode = next(
-                (key, qnode)
-                for key, qnode in qgraph["nodes"].items()
-                if qnode.get("ids", None) is not None
+            # with a limit on each, their combinations reach it if they
+            # are all nonempty
+            solutions = await asyncio.gather(
+                *(
+                    kps[idx % len(kps)]._lookup(
+                        component, memo, interner, limit, deadline
+                    )
+                    for idx, component in enumerate(components)
+                )
             )
-        except StopIteration:
-            raise RuntimeError("Cannot find qnode with ids in %s", str(qgraph["nodes"]))
-
-        qgraph_ = copy.deepcopy(qgraph)
-        qedge_id, qedge = next(
-            (qedge_id, qedge)
-            for qedge_id, qedge in list(qgraph["edges"].items())
-            if source_qnode_id in (qedge["subject"], qedge["object"])
-            and qgraph_["edges"].pop(qedge_id) is not None
+        finally:
+            for db in connections:
+                self.pool.release(db)
+
+        kgraph = {"nodes": dict(), "edges": dict()}
+        if any(complete and not table for _, table, complete in solutions):
+            return kgraph, BindingTable.empty(interner), True
+        complete = all(complete for _, _, complete in solutions)
+        for kgraph_, _, _ in solutions:
+            kgraph["edges"].update(kgraph_["edges"])
+        table = BindingTable.product(
+            interner, [table for _, table, _ in solutions], limit
+        )
+        if limit is not None and len(table) >= limit:
+            num_combinations = 1
+            for _, table_, _ in solutions:
+                num_combinations *= len(table_)
+            complete = complete and num_combinations <= limit
+        return kgraph, table, complete
+
+    async def _expand(
+        self,
+        qgraph: SubGraph,
+        memo: Memo,
+        interner: Interner,
+        limit: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ):
+        """Solve one qedge from a pinned qnode, then the rest recursively."""
+        LOGGER.debug("Lookup for qgraph: %s", qgraph)
+        kgraph = {"nodes": dict(), "edges": dict()}
+        tables = []
+        num_results = 0
+        complete = True
+        pinned = {
+            qnode_id
+            for qnode_id in qgraph.node_ids()
+            if qgraph.qnode(qnode_id).get("ids", None) is not None
+        }
+        if not pinned:
+            raise RuntimeError("Cannot find qnode with ids in %s", str(qgraph))
+
+        # expand along the most selective qedge touching a pinned qnode
+        statistics = await self.get_statistics()
+        qedge_id = min(
+            (
+                qedge_id
+                for qedge_id in qgraph.edge_ids
+                if qgraph.qedges[qedge_id]["subject"] in pinned
+                or qgraph.qedges[qedge_id]["object"] in pinned
+            ),
+            key=lambda qedge_id: statistics.estimate(
+                qgraph.qedges[qedge_id],
+                qgraph.qnode(qgraph.qedges[qedge_id]["subject"]),
+                qgraph.qnode(qgraph.qedges[qedge_id]["object"]),
+            ),
         )
+        qedge = qgraph.qedges[qedge_id]
 
         # get kedges for qedge
-        constraints = self.get_edge_constraints(qedge, qgraph_)
+        constraints = self.get_edge_constraints(qedge, qgraph)
         symmetric_constraints = None
         if (
             any(is_symmetric(predicate) for predicate in qedge.get("predicates", []))
             and qedge["subject"] != qedge["object"]
         ):
-            symmetric_qedge = copy.deepcopy(qedge)
-            symmetric_qedge["subject"], symmetric_qedge["object"] = (
-                symmetric_qedge["object"],
-                symmetric_qedge["subject"],
-            )
-
-            symmetric_constraints = self.get_edge_constraints(symmetric_qedge, qgraph_)
+            symmetric_qedge = {
+                **qedge,
+                "subject": qedge["object"],
+                "object": qedge["subject"],
+            }
+            symmetric_constraints = self.get_edge_constraints(symmetric_qedge, qgraph)
 
         for flipped, constraints in (
             (False, constraints),
@@ -254,116 +563,487 @@ class KnowledgeProvider:
         ):
             if constraints is None:
                 continue
+            if _expired(deadline):
+                complete = False
+                break
             kedges = await self.get_kedges(**constraints)
+            self.metrics.count("expansions", len(kedges))
+            self.metrics.maximum("max_fanout", len(kedges))
 
             for kedge_id, kedge in kedges.items():
+                if flipped and kedge["subject"] == kedge["object"]:
+                    # self-loops match both ways; keep the forward match
+                    continue
+                if (limit is not None and num_results >= limit) or _expired(deadline):
+                    complete = False
+                    break
                 LOGGER.debug(
                     "Expanding along edge %s/%s...",
                     qedge_id,
                     kedge_id,
                 )
-                # now solve the smaller question
-
-                qgraph__ = copy.deepcopy(qgraph_)
-                # pin node
-                qgraph__["nodes"][qedge["subject"]]["ids"] = [kedge["subject"]]
-                qgraph__["nodes"][qedge["object"]]["ids"] = [kedge["object"]]
-                # remove orphaned nodes
-                qgraph__.remove_orphaned()
+                if flipped:
+                    subject_id, object_id = kedge["object"], kedge["subject"]
+                else:
+                    subject_id, object_id = kedge["subject"], kedge["object"]
 
-                kgraph_, results_ = await self.lookup(qgraph__)
+                # now solve the smaller question, with the nodes pinned
+                kgraph_, table, complete_ = await self._lookup(
+                    qgraph.pin(
+                        qedge_id,
+                        {
+                            qedge["subject"]: (subject_id,),
+                            qedge["object"]: (object_id,),
+                        },
+                    ),
+                    memo,
+                    interner,
+                    None if limit is None else limit - num_results,
+                    deadline,
+                )
+                complete = complete and complete_
 
                 # add edge to results and kgraph
                 kgraph["edges"][kedge_id] = kedge
-                subject_knode_id, subject_knode = await self.get_knode(kedge["subject"])
-                object_knode_id, object_knode = await self.get_knode(kedge["object"])
-                kgraph["nodes"][subject_knode_id] = subject_knode
-                kgraph["nodes"][object_knode_id] = object_knode
-
-                if flipped:
-                    results_ = [
-                        {
-                            "node_bindings": {
-                                **result["node_bindings"],
-                                qedge["subject"]: [
-                                    {
-                                        "id": kedge["object"],
-                                    }
-                                ],
-                                qedge["object"]: [
-                                    {
-                                        "id": kedge["subject"],
-                                    }
-                                ],
-                            },
-                            "edge_bindings": {
-                                **result["edge_bindings"],
-                                qedge_id: [
-                                    {
-                                        "id": kedge_id,
-                                    }
-                                ],
-                            },
-                        }
-                        for result in results_
-                    ]
-                else:
-                    results_ = [
-                        {
-                            "node_bindings": {
-                                **result["node_bindings"],
-                                qedge["subject"]: [
-                                    {
-                                        "id": kedge["subject"],
-                                    }
-                                ],
-                                qedge["object"]: [
-                                    {
-                                        "id": kedge["object"],
-                                    }
-                                ],
-                            },
-                            "edge_bindings": {
-                                **result["edge_bindings"],
-                                qedge_id: [
-                                    {
-                                        "id": kedge_id,
-                                    }
-                                ],
-                            },
-                        }
-                        for result in results_
-                    ]
-                kgraph["nodes"].update(kgraph_["nodes"])
                 kgraph["edges"].update(kgraph_["edges"])
-                results.extend(results_)
+                if table:
+                    tables.append(
+                        table.bind(
+                            {qedge["subject"]: subject_id, qedge["object"]: object_id},
+                            {qedge_id: kedge_id},
+                        )
+                    )
+                    num_results += len(table)
+                if not complete:
+                    break
+            if not complete:
+                break
+
+        return kgraph, BindingTable.concat(interner, tables), complete
+
+    async def join_lookup(
+        self,
+        qgraph: Graph,
+        max_results: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        """Solve query graph with a single SQL join.
+
+        Reading stops after max_results results or timeout seconds,
+        noting the truncation in logs. The timeout is checked between
+        batches of rows.
+        """
+        interner = Interner()
+        table = BindingTable.concat(
+            interner,
+            [
+                table
+                async for table in self._iter_join(
+                    qgraph, interner, max_results, timeout
+                )
+            ],
+        )
+        # kedge records are read by finish_kgraph()
+        kgraph = {"nodes": dict(), "edges": dict.fromkeys(table.edge_ids())}
+        await self.finish_kgraph(kgraph)
+        with self.metrics.timer("materialize"):
+            results = table.results()
+        return kgraph, results
+
+    async def _iter_join(
+        self,
+        qgraph: Graph,
+        interner: Interner,
+        max_results: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[BindingTable]:
+        """Generate binding tables of batches of join rows, interning ids."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # fetch one more row than needed, to detect truncation
+        plan = JoinPlan(qgraph, None if max_results is None else max_results + 1)
+        LOGGER.debug("Join lookup: %s", plan.sql)
+        try:
+            with self.metrics.timer("sql"):
+                cursor = await self._cursor(plan.sql, plan.values)
+            self.metrics.count("sql_statements")
+        except sqlite3.OperationalError as err:
+            key = plan.unknown_column(str(err))
+            if key is not None:
+                LOGGER.warning("Unrecognized key '%s'", key)
+                return
+            raise
+        num_rows = 0
+        try:
+            while True:
+                if _expired(deadline):
+                    self._log_truncation(max_results, deadline)
+                    break
+                with self.metrics.timer("sql"):
+                    rows = await cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                self.metrics.count("rows", len(rows))
+                truncated = (
+                    max_results is not None and num_rows + len(rows) > max_results
+                )
+                if truncated:
+                    rows = rows[: max_results - num_rows]
+                num_rows += len(rows)
+                yield BindingTable.from_rows(
+                    interner,
+                    list(plan.qnode_aliases),
+                    list(plan.qedge_aliases),
+                    rows,
+                )
+                if truncated:
+                    self._log_truncation(max_results, deadline)
+                    return
+        finally:
+            await cursor.close()
+
+    async def frontier_lookup(
+        self,
+        qgraph: Graph,
+        max_results: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        """Solve query graph one qedge at a time, for all partial results.
+
+        Stops after timeout seconds, noting the timeout in logs, as does
+        truncation at max_results. Results found by then are returned if
+        every qedge was reached, and none otherwise.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        kgraph, table, complete = await self._frontier(qgraph, max_results, deadline)
+        if not complete:
+            self._log_truncation(max_results, deadline)
+        await self.finish_kgraph(kgraph)
+        with self.metrics.timer("materialize"):
+            results = table.results()
+        return kgraph, results
+
+    async def _frontier(
+        self,
+        qgraph: Graph,
+        limit: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ):
+        """Get kgraph, binding table of at most limit results, and whether
+        they are complete.
+
+        Each step looks up kedges for the most selective qedge touching a
+        qnode with ids or bound ids, the latter IN (...) in chunks small
+        enough to keep each statement below MAX_PARAMETERS, and joins them
+        to the partial results.
+        """
+        statistics = await self.get_statistics()
+        interner = Interner()
+        table = BindingTable(interner)
+        records = dict()
+        remaining = list(qgraph["edges"])
+        complete = True
+        while remaining and table:
+            # bound qnodes are constrained to their bound ids
+            qnodes = {
+                qnode_id: (
+                    {**qnode, "ids": sorted(table.values(qnode_id))}
+                    if qnode_id in table.node_columns
+                    else qnode
+                )
+                for qnode_id, qnode in qgraph["nodes"].items()
+            }
+            candidates = [
+                qedge_id
+                for qedge_id in remaining
+                if qnodes[qgraph["edges"][qedge_id]["subject"]].get("ids", None)
+                is not None
+                or qnodes[qgraph["edges"][qedge_id]["object"]].get("ids", None)
+                is not None
+            ]
+            if not candidates:
+                raise RuntimeError("Cannot find qnode with ids in %s", str(qgraph))
+            qedge_id = min(
+                candidates,
+                key=lambda qedge_id: statistics.estimate(
+                    qgraph["edges"][qedge_id],
+                    qnodes[qgraph["edges"][qedge_id]["subject"]],
+                    qnodes[qgraph["edges"][qedge_id]["object"]],
+                ),
+            )
+            remaining.remove(qedge_id)
+            qedge = qgraph["edges"][qedge_id]
+
+            matches, complete = await self._frontier_kedges(
+                qedge, qnodes, records, deadline
+            )
+            if not complete and remaining:
+                # there are no results until every qedge is joined
+                return (
+                    {"nodes": dict(), "edges": dict()},
+                    BindingTable.empty(interner),
+                    False,
+                )
+            self.metrics.count("expansions", len(matches))
+            table = table.join(
+                qedge_id,
+                qedge["subject"],
+                qedge["object"],
+                matches,
+                # one more than needed, to detect truncation
+                None if remaining or limit is None else limit + 1,
+            )
+            self.metrics.maximum("max_frontier", len(table))
+
+        if remaining:
+            table = BindingTable.empty(interner)
+        complete = complete and (limit is None or len(table) <= limit)
+        table = table.head(limit)
+        kgraph = {
+            "nodes": dict(),
+            "edges": {kedge_id: records[kedge_id] for kedge_id in table.edge_ids()},
+        }
+        return kgraph, table, complete
 
-        for kedge in kgraph["edges"].values():
-            kedge["attributes"] = [
+    async def _frontier_kedges(
+        self,
+        qedge: Dict,
+        qnodes: Dict[str, Dict],
+        records: Dict,
+        deadline: Optional[float] = None,
+    ) -> Tuple[Set[Tuple[str, str, str]], bool]:
+        """Get (subject id, object id, kedge id) matching qedge, and whether
+        they were all found in time.
+
+        qnodes have bound ids, if any. Kedges are added to records.
+        """
+        # the qnode with fewer ids is looked up in chunks
+        pinned = min(
+            (
+                qedge[role]
+                for role in ("subject", "object")
+                if qnodes[qedge[role]].get("ids", None) is not None
+            ),
+            key=lambda qnode_id: len(qnodes[qnode_id]["ids"]),
+        )
+        orientations = [(False, qedge)]
+        if (
+            any(is_symmetric(predicate) for predicate in qedge.get("predicates", []))
+            and qedge["subject"] != qedge["object"]
+        ):
+            orientations.append(
+                (
+                    True,
+                    {**qedge, "subject": qedge["object"], "object": qedge["subject"]},
+                )
+            )
+
+        other = qedge["object"] if pinned == qedge["subject"] else qedge["subject"]
+        unpinned = {
+            qnode_id: {
+                key: value for key, value in qnodes[qnode_id].items() if key != "ids"
+            }
+            for qnode_id in (pinned, other)
+        }
+        # parameters left for ids, after padding
+        _, values = build_conditions(
+            **self.get_edge_constraints(qedge, {"nodes": unpinned})
+        )
+        budget = MAX_PARAMETERS - len(values)
+        other_qnode = unpinned[other]
+        other_ids = None
+        if other != pinned and qnodes[other].get("ids", None) is not None:
+            _, values = build_conditions(id={"$in": qnodes[other]["ids"]})
+            if len(values) <= budget // 2:
+                other_qnode = qnodes[other]
+                budget -= len(values)
+            else:
+                # too many to fit beside a chunk; filter them here instead
+                other_ids = set(qnodes[other]["ids"])
+        # chunks padded to a power of two fit in what is left
+        chunk_size = min(MAX_VARIABLES, 1 << (max(budget, 1).bit_length() - 1))
+
+        ids = qnodes[pinned]["ids"]
+        matches = set()
+        for start in range(0, len(ids), chunk_size):
+            chunk_qgraph = {
+                "nodes": {
+                    other: other_qnode,
+                    pinned: {
+                        **qnodes[pinned],
+                        "ids": ids[start : start + chunk_size],
+                    },
+                }
+            }
+            for flipped, oriented_qedge in orientations:
+                if _expired(deadline):
+                    return matches, False
+                kedges = await self.get_kedges(
+                    **self.get_edge_constraints(oriented_qedge, chunk_qgraph)
+                )
+                for kedge_id, kedge in kedges.items():
+                    if flipped:
+                        match = (kedge["object"], kedge["subject"], kedge_id)
+                    else:
+                        match = (kedge["subject"], kedge["object"], kedge_id)
+                    if (
+                        other_ids is not None
+                        and match[0 if other == qedge["subject"] else 1]
+                        not in other_ids
+                    ):
+                        continue
+                    records[kedge_id] = kedge
+                    matches.add(match)
+        return matches, True
+
+    async def iter_results(
+        self,
+        qgraph: Dict[str, Any],
+        max_results: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[Tuple[Dict, Dict]]:
+        """Generate results, with the kedges they bind, as they are found.
+
+        Joins are read from the database FETCH_SIZE rows at a time; other
+        query graphs are solved in full first. The kedges lack knodes and
+        provenance, which finish_kgraph() adds; those of joins are None
+        until finish_kgraph() reads them.
+        """
+        with self.metrics.timer("normalize"):
+            qgraph = prepare_qgraph(qgraph)
+        if self.strategy == "join" and is_joinable(qgraph):
+            async for table in self._iter_join(
+                qgraph, Interner(), max_results, timeout
+            ):
+                for result in table.iter_results():
+                    yield result, {
+                        binding["id"]: None
+                        for bindings in result["edge_bindings"].values()
+                        for binding in bindings
+                    }
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self.strategy == "frontier":
+            kgraph, table, complete = await self._frontier(
+                qgraph, max_results, deadline
+            )
+        else:
+            kgraph, table, complete = await self._lookup_at_most(
+                SubGraph.from_graph(qgraph),
+                Memo(self.memo_size),
+                Interner(),
+                max_results,
+                deadline,
+            )
+        if not complete:
+            self._log_truncation(max_results, deadline)
+        # results are built one at a time, as they are sent
+        for result in table.iter_results():
+            yield result, {
+                binding["id"]: kgraph["edges"][binding["id"]]
+                for bindings in result["edge_bindings"].values()
+                for binding in bindings
+            }
+
+    async def finish_kgraph(self, kgraph: Dict):
+        """Add knodes and provenance for the bound kedges.
+
+        Kedges that are None are read from the database, and KEdge records
+        are converted to TRAPI edges.
+        """
+        missing = [
+            kedge_id for kedge_id, kedge in kgraph["edges"].items() if kedge is None
+        ]
+        with self.metrics.timer("kedges"):
+            for start in range(0, len(missing), MAX_VARIABLES):
+                kgraph["edges"].update(
+                    await self.get_kedges(
+                        **{"edge.id": {"$in": missing[start : start + MAX_VARIABLES]}}
+                    )
+                )
+        with self.metrics.timer("knodes"):
+            knodes = await self.get_knodes(
                 {
-                    "attribute_type_id": "biolink:knowledge_source",
-                    "value": f"infores:{self.name}",
+                    knode_id
+                    for kedge in kgraph["edges"].values()
+                    for knode_id in (kedge["subject"], kedge["object"])
                 }
-            ]
-        return kgraph, results
+            )
+        self.metrics.count("knodes", len(knodes))
+        kgraph["nodes"].update(knodes)
+        source = f"infores:{self.name}"
+        kgraph["edges"] = {
+            kedge_id: (kedge.to_dict() if isinstance(kedge, KEdge) else dict(kedge))
+            | {
+                "attributes": [
+                    {
+                        "attribute_type_id": "biolink:knowledge_source",
+                        "value": source,
+                    }
+                ]
+            }
+            for kedge_id, kedge in kgraph["edges"].items()
+        }
 
     async def get_knode(self, knode_id: str) -> Tuple[str, Dict]:
         """Get knode by id."""
-        async with self.db.execute(
-            "SELECT * FROM nodes WHERE id = ?",
-            [knode_id],
-        ) as cursor:
-            row = await cursor.fetchone()
-        if row is None:
+        knodes = await self.get_knodes([knode_id])
+        return knode_id, knodes[knode_id]
+
+    async def get_knodes(self, knode_ids: Iterable[str]) -> Dict[str, Dict]:
+        """Get knodes by id.
+
+        Nodes are fetched with chunked IN (...) queries.
+        """
+        knode_ids = list(dict.fromkeys(knode_ids))
+        knodes = dict()
+        for start in range(0, len(knode_ids), MAX_VARIABLES):
+            chunk = knode_ids[start : start + MAX_VARIABLES]
+            conditions, values = build_conditions(id={"$in": chunk})
+            rows = await self._fetchall(
+                "SELECT * FROM nodes WHERE " + conditions,
+                values,
+            )
+            if not rows:
+                continue
+            columns = rows[0].keys()
+            id_idx = columns.index("id")
+            category_idx = columns.index("category")
+            # other columns are passed through
+            extra = [
+                (idx, column)
+                for idx, column in enumerate(columns)
+                if column not in ("id", "category")
+            ]
+            for row in rows:
+                knode = {column: row[idx] for idx, column in extra}
+                knode["categories"] = [row[category_idx]]
+                knodes[row[id_idx]] = knode
+        if len(knodes) < len(knode_ids):
             raise NoAnswersException()
-        return row["id"], {
-            k: v for k, v in dict(row).items() if k not in ("id", "category")
-        } | {"categories": [row["category"]]}
-
-    async def get_results(self, qgraph: Dict[str, Any]):
-        """Get results and kgraph."""
-        qgraph = copy.deepcopy(qgraph)
-        qgraph = Graph(qgraph)
-        normalize_qgraph(qgraph)
-        kgraph, results = await self.lookup(qgraph)
+        return knodes
+
+    async def get_results(
+        self,
+        qgraph: Dict[str, Any],
+        max_results: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        """Get results and kgraph.
+
+        At most max_results results are found, within about timeout
+        seconds. Truncation is noted in logs.
+        """
+        with self.metrics.timer("normalize"):
+            qgraph = prepare_qgraph(qgraph)
+        with self.metrics.timer("lookup"):
+            if self.strategy == "join" and is_joinable(qgraph):
+                kgraph, results = await self.join_lookup(qgraph, max_results, timeout)
+            elif self.strategy == "frontier":
+                kgraph, results = await self.frontier_lookup(
+                    qgraph, max_results, timeout
+                )
+            else:
+                kgraph, results = await self.lookup(
+                    qgraph, max_results=max_results, timeout=timeout
+                )
         return kgraph, results
@@ -1,32 +1,297 @@
+"""Query graphs."""
 import json
+from collections import Counter, defaultdict
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any, Hashable, List, Optional, Set, Tuple
+
+
+def canonicalize(value: Any) -> Hashable:
+    """Get hashable form of JSON-like value.
+
+    Objects are compared as sets of members and lists as multisets of
+    elements, so neither key nor element order matters.
+    """
+    if isinstance(value, Mapping):
+        return (
+            dict,
+            frozenset((key, canonicalize(item)) for key, item in value.items()),
+        )
+    if isinstance(value, (list, tuple)):
+        return (
+            list,
+            frozenset(Counter(canonicalize(item) for item in value).items()),
+        )
+    if isinstance(value, bool):
+        # True == 1, but they are different JSON values
+        return (bool, value)
+    return value
+
+
+class _Edges(dict):
+    """Edges of a Graph, counting changes to know when its index is stale."""
+
+    version = 0
+
+
+def _counted(name: str):
+    """Wrap dict method to count changes."""
+    method = getattr(dict, name)
+
+    def wrapped(self, *args, **kwargs):
+        self.version += 1
+        return method(self, *args, **kwargs)
+
+    wrapped.__name__ = name
+    wrapped.__doc__ = method.__doc__
+    return wrapped
+
+
+for _name in (
+    "__setitem__",
+    "__delitem__",
+    "__ior__",
+    "clear",
+    "pop",
+    "popitem",
+    "setdefault",
+    "update",
+):
+    setattr(_Edges, _name, _counted(_name))
+del _name
 
 
 class Graph(dict):
-    """Graph."""
+    """Graph.
+
+    Edges are indexed by node on first use, until they are added, removed
+    or replaced. Replace, rather than edit, edges whose ends change.
+    """
+
+    _index = None
 
     def __init__(self, *args, **kwargs):
         """Initialize."""
         super().__init__(*args, **kwargs)
+        if "edges" in self:
+            self["edges"] = self["edges"]
+
+    def __setitem__(self, key, value):
+        """Set member, keeping track of changes to edges."""
+        if key == "edges" and not isinstance(value, _Edges):
+            value = _Edges(value)
+        super().__setitem__(key, value)
+
+    def update(self, *args, **kwargs):
+        """Update members, keeping track of changes to edges."""
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        """Get member, setting it first if missing."""
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def __ior__(self, other):
+        """Update members, keeping track of changes to edges."""
+        self.update(other)
+        return self
 
     def __hash__(self):
         """Compute hash."""
         return hash(json.dumps(self, sort_keys=True))
 
+    def canonical(self) -> Hashable:
+        """Get canonical form, in which key and element order do not matter.
+
+        This is computed anew on each call; keep it as a key.
+        """
+        return canonicalize(self)
+
+    def adjacency(self) -> Mapping[str, Tuple[Tuple[str, ...], Tuple[str, ...]]]:
+        """Get index from node id to outgoing and incoming edge ids."""
+        edges = self["edges"]
+        if self._index is not None:
+            indexed, version, adjacency = self._index
+            if indexed is edges and version == edges.version:
+                return adjacency
+        adjacency = defaultdict(lambda: ([], []))
+        for edge_id, edge in edges.items():
+            adjacency[edge["subject"]][0].append(edge_id)
+            adjacency[edge["object"]][1].append(edge_id)
+        adjacency = {
+            node_id: (tuple(outgoing), tuple(incoming))
+            for node_id, (outgoing, incoming) in adjacency.items()
+        }
+        self._index = (edges, edges.version, adjacency)
+        return adjacency
+
     def connected_edges(self, node_id):
         """Find edges connected to node."""
-        outgoing = []
-        incoming = []
-        for edge_id, edge in self["edges"].items():
-            if node_id == edge["subject"]:
-                outgoing.append(edge_id)
-            if node_id == edge["object"]:
-                incoming.append(edge_id)
-        return outgoing, incoming
+        outgoing, incoming = self.adjacency().get(node_id, ((), ()))
+        return list(outgoing), list(incoming)
+
+    def degree(self, node_id) -> int:
+        """Count edges connected to node."""
+        outgoing, incoming = self.adjacency().get(node_id, ((), ()))
+        return len(outgoing) + len(incoming)
 
     def remove_orphaned(self):
         """Remove nodes with degree 0."""
+        adjacency = self.adjacency()
         self["nodes"] = {
             node_id: node
             for node_id, node in self["nodes"].items()
-            if any(self.connected_edges(node_id))
+            if node_id in adjacency
         }
+
+
+class _PinnedNodes(Mapping):
+    """Qnodes of a SubGraph, with pinned ids applied."""
+
+    def __init__(self, subgraph: "SubGraph"):
+        """Initialize."""
+        self.subgraph = subgraph
+
+    def __getitem__(self, qnode_id):
+        """Get qnode."""
+        return self.subgraph.qnode(qnode_id)
+
+    def __iter__(self):
+        """Iterate over qnode ids."""
+        return iter(self.subgraph.node_ids())
+
+    def __len__(self):
+        """Count qnodes."""
+        return len(self.subgraph.node_ids())
+
+
+class SubGraph:
+    """Query sub-graph sharing structure with the graph it came from.
+
+    qnodes and qedges are read-only records shared by all sub-graphs,
+    edge_ids are the qedges left to solve and pins overrides the ids of
+    qnodes bound so far. Nodes not touched by any remaining qedge are
+    implicitly orphaned.
+    """
+
+    __slots__ = ("qnodes", "qedges", "edge_ids", "pins")
+
+    def __init__(
+        self,
+        qnodes: Mapping[str, Mapping],
+        qedges: Mapping[str, Mapping],
+        edge_ids: Optional[Tuple[str, ...]] = None,
+        pins: Optional[Mapping[str, Tuple[str, ...]]] = None,
+    ):
+        """Initialize."""
+        self.qnodes = qnodes
+        self.qedges = qedges
+        self.edge_ids = tuple(qedges) if edge_ids is None else edge_ids
+        self.pins = MappingProxyType(dict(pins or {}))
+
+    @classmethod
+    def from_graph(cls, graph) -> "SubGraph":
+        """Freeze query graph."""
+        return cls(
+            MappingProxyType(
+                {
+                    qnode_id: MappingProxyType(dict(qnode))
+                    for qnode_id, qnode in graph["nodes"].items()
+                }
+            ),
+            MappingProxyType(
+                {
+                    qedge_id: MappingProxyType(dict(qedge))
+                    for qedge_id, qedge in graph["edges"].items()
+                }
+            ),
+        )
+
+    def __repr__(self):
+        """Represent sub-graph."""
+        return f"SubGraph(edges={list(self.edge_ids)}, pins={dict(self.pins)})"
+
+    def __getitem__(self, key):
+        """Get "nodes" or "edges", as for Graph."""
+        if key == "nodes":
+            return _PinnedNodes(self)
+        if key == "edges":
+            return {qedge_id: self.qedges[qedge_id] for qedge_id in self.edge_ids}
+        raise KeyError(key)
+
+    def signature(self) -> Hashable:
+        """Identify the sub-problem: the remaining qedges and pinned ids."""
+        return frozenset(self.edge_ids), frozenset(self.pins.items())
+
+    def node_ids(self) -> List[str]:
+        """Get ids of qnodes touched by the remaining qedges."""
+        node_ids = dict()
+        for qedge_id in self.edge_ids:
+            qedge = self.qedges[qedge_id]
+            node_ids[qedge["subject"]] = None
+            node_ids[qedge["object"]] = None
+        return list(node_ids)
+
+    def qnode(self, qnode_id: str) -> Mapping:
+        """Get qnode, with pinned ids applied."""
+        qnode = self.qnodes[qnode_id]
+        if qnode_id in self.pins:
+            return {**qnode, "ids": list(self.pins[qnode_id])}
+        return qnode
+
+    def components(self) -> List["SubGraph"]:
+        """Split into sub-graphs that share only qnodes bound to one id.
+
+        Their results are independent, so the results of the whole are
+        all combinations of theirs.
+        """
+        bound = {
+            qnode_id
+            for qnode_id in self.node_ids()
+            if len(self.qnode(qnode_id).get("ids", None) or ()) == 1
+        }
+        # (unbound qnode ids, qedge ids) per component
+        groups: List[Tuple[Set[str], Set[str]]] = []
+        for qedge_id in self.edge_ids:
+            qedge = self.qedges[qedge_id]
+            free = {qedge["subject"], qedge["object"]} - bound
+            group = (free, {qedge_id})
+            for other in [other for other in groups if other[0] & free]:
+                groups.remove(other)
+                group[0].update(other[0])
+                group[1].update(other[1])
+            groups.append(group)
+        if len(groups) < 2:
+            return [self]
+        components = []
+        for _, qedge_ids in groups:
+            edge_ids = tuple(
+                qedge_id for qedge_id in self.edge_ids if qedge_id in qedge_ids
+            )
+            component = SubGraph(self.qnodes, self.qedges, edge_ids)
+            node_ids = set(component.node_ids())
+            component.pins = MappingProxyType(
+                {
+                    qnode_id: ids
+                    for qnode_id, ids in self.pins.items()
+                    if qnode_id in node_ids
+                }
+            )
+            components.append(component)
+        return components
+
+    def pin(self, qedge_id: str, pins: Mapping[str, Tuple[str, ...]]) -> "SubGraph":
+        """Get sub-graph with qedge solved and its qnodes pinned."""
+        edge_ids = tuple(edge_id for edge_id in self.edge_ids if edge_id != qedge_id)
+        subgraph = SubGraph(self.qnodes, self.qedges, edge_ids)
+        node_ids = set(subgraph.node_ids())
+        subgraph.pins = MappingProxyType(
+            {
+                qnode_id: ids
+                for qnode_id, ids in {**self.pins, **pins}.items()
+                if qnode_id in node_ids
+            }
+        )
+        return subgraph
@@ -0,0 +1,143 @@
+"""In-memory knowledge provider."""
+from collections import Counter, defaultdict
+import logging
+from typing import Dict, Iterable, Optional
+
+from .engine import KnowledgeProvider
+from .graph import Graph
+from .statistics import Statistics
+from .util import check_conditions, NoAnswersException
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _candidate_values(condition):
+    """Get the values allowed by an equality or $in condition, if any."""
+    if condition is None:
+        return None
+    if isinstance(condition, dict):
+        return condition.get("$in", None) if len(condition) == 1 else None
+    return [condition]
+
+
+class InMemoryKnowledgeProvider(KnowledgeProvider):
+    """Knowledge provider over an in-memory adjacency index.
+
+    Nodes and edges are rows as for build_db.add_data(). Kedges are
+    looked up through the same constraints as the SQL-backed provider.
+    """
+
+    def __init__(
+        self,
+        nodes: Iterable[Dict],
+        edges: Iterable[Dict],
+        name: Optional[str] = None,
+        **kwargs,
+    ):
+        """Initialize."""
+        super().__init__(":memory:", name=name, **kwargs)
+        self.database_file = None
+        self.nodes = dict()
+        for node in nodes:
+            self.nodes.setdefault(node["id"], node)
+        self.edges = dict()
+        # node id -> predicate -> edge ids
+        self.outgoing = defaultdict(lambda: defaultdict(list))
+        self.incoming = defaultdict(lambda: defaultdict(list))
+        for edge in edges:
+            if edge["id"] in self.edges:
+                continue
+            self.edges[edge["id"]] = edge
+            self.outgoing[edge["subject"]][edge["predicate"]].append(edge["id"])
+            self.incoming[edge["object"]][edge["predicate"]].append(edge["id"])
+
+    async def __aenter__(self):
+        """Enter context."""
+        return self
+
+    async def __aexit__(self, *args):
+        """Exit context."""
+
+    async def join_lookup(
+        self,
+        qgraph: Graph,
+        max_results: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        """Solve query graph by navigating the index edge by edge."""
+        return await self.lookup(qgraph, max_results=max_results, timeout=timeout)
+
+    def _candidates(self, kwargs):
+        """Get ids of edges that may satisfy the constraints."""
+        predicates = _candidate_values(kwargs.get("edge.predicate", None))
+        for role, adjacency in (
+            ("subject", self.outgoing),
+            ("object", self.incoming),
+        ):
+            knode_ids = _candidate_values(kwargs.get(f"{role}.id", None))
+            if knode_ids is None:
+                continue
+            for knode_id in knode_ids:
+                if knode_id not in adjacency:
+                    continue
+                by_predicate = adjacency[knode_id]
+                for predicate in by_predicate if predicates is None else predicates:
+                    yield from by_predicate.get(predicate, [])
+            return
+        yield from self.edges
+
+    async def get_statistics(self) -> Statistics:
+        """Get statistics of the index for query planning."""
+        if self._statistics is None:
+            self._statistics = Statistics(
+                num_nodes=len(self.nodes),
+                num_edges=len(self.edges),
+                category_counts=Counter(
+                    node["category"] for node in self.nodes.values()
+                ),
+                predicate_counts=Counter(
+                    edge["predicate"] for edge in self.edges.values()
+                ),
+            )
+        return self._statistics
+
+    async def get_kedges(self, **kwargs):
+        """Get kedges."""
+        assert kwargs
+        kedges = dict()
+        for kedge_id in self._candidates(kwargs):
+            edge = self.edges[kedge_id]
+            records = {
+                "edge": edge,
+                "subject": self.nodes.get(edge["subject"], None),
+                "object": self.nodes.get(edge["object"], None),
+            }
+            if records["subject"] is None or records["object"] is None:
+                continue
+
+            def values(key):
+                role, column = key.split(".", 1)
+                return records[role][column]
+
+            try:
+                matched = check_conditions(values, **kwargs)
+            except KeyError as err:
+                LOGGER.warning("Unrecognized key '%s'", err.args[0])
+                return {}
+            if matched:
+                kedges[kedge_id] = {
+                    key: value for key, value in edge.items() if key != "id"
+                }
+        return kedges
+
+    async def get_knodes(self, knode_ids: Iterable[str]) -> Dict[str, Dict]:
+        """Get knodes by id."""
+        knodes = dict()
+        for knode_id in knode_ids:
+            row = self.nodes.get(knode_id, None)
+            if row is None:
+                raise NoAnswersException()
+            knodes[knode_id] = {
+                k: v for k, v in row.items() if k not in ("id", "category")
+            } | {"categories": [row["category"]]}
+        return knodes
@@ -0,0 +1,51 @@
+"""Per-query instrumentation."""
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+import time
+from typing import Any, Dict
+
+
+class QueryMetrics:
+    """Time spent and work done answering one query.
+
+    timings holds seconds per phase, which may overlap (e.g. "sql" time
+    is part of "lookup" time). counts holds counters and maxima.
+    """
+
+    def __init__(self):
+        """Initialize."""
+        self.timings = defaultdict(float)
+        self.counts = Counter()
+
+    @contextmanager
+    def timer(self, name: str):
+        """Add the time spent in the context to the named phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def count(self, name: str, value: int = 1):
+        """Increment counter."""
+        self.counts[name] += value
+
+    def maximum(self, name: str, value: int):
+        """Record value if it is the largest so far."""
+        if value > self.counts[name]:
+            self.counts[name] = value
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Get timings, in milliseconds, and counts."""
+        return {
+            "timings_ms": {
+                name: round(seconds * 1000, 3) for name, seconds in self.timings.items()
+            },
+            "counts": dict(self.counts),
+        }
+
+    def server_timing(self) -> str:
+        """Format timings as a Server-Timing header value."""
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.timings.items()
+        )
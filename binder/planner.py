@@ -0,0 +1,152 @@
+"""Single-statement SQL join planner."""
+import itertools
+import re
+from typing import Dict, List, Optional
+
+from .util import build_conditions, is_symmetric, KEY_MAP
+
+
+def get_constraints(alias: str, element: Dict, exclude=()):
+    """Get conditions on table alias from query-graph element."""
+    kwargs = dict()
+    for key, value in element.items():
+        if key in exclude:
+            continue
+        if isinstance(value, list) and len(value) == 1:
+            value = value[0]
+        if isinstance(value, list):
+            kwargs[f"{alias}.{KEY_MAP.get(key, key)}"] = {"$in": value}
+        else:
+            kwargs[f"{alias}.{KEY_MAP.get(key, key)}"] = value
+    return kwargs
+
+
+def is_joinable(qgraph) -> bool:
+    """Determine whether query graph can be solved by a single join.
+
+    The edges must form one connected component containing at least one
+    qnode with ids.
+    """
+    if not qgraph["edges"]:
+        return False
+    qnode_ids = {
+        qnode_id
+        for qedge in qgraph["edges"].values()
+        for qnode_id in (qedge["subject"], qedge["object"])
+    }
+    if not any(
+        qgraph["nodes"][qnode_id].get("ids", None) is not None for qnode_id in qnode_ids
+    ):
+        return False
+    component = {next(iter(qnode_ids))}
+    edges = list(qgraph["edges"].values())
+    grown = True
+    while grown:
+        grown = False
+        for qedge in edges:
+            ends = {qedge["subject"], qedge["object"]}
+            if ends & component and not ends <= component:
+                component |= ends
+                grown = True
+    return component == qnode_ids
+
+
+class JoinPlan:
+    """SQL join over edges/nodes with one alias per qedge/qnode.
+
+    Rows hold the ids bound to the qnodes of qnode_aliases, then to the
+    qedges of qedge_aliases.
+    """
+
+    def __init__(self, qgraph, limit: Optional[int] = None):
+        """Compile query graph, returning at most limit rows if given."""
+        self.qnode_aliases = dict()
+        for qedge in qgraph["edges"].values():
+            for qnode_id in (qedge["subject"], qedge["object"]):
+                self.qnode_aliases.setdefault(qnode_id, f"n{len(self.qnode_aliases)}")
+        self.qedge_aliases = {
+            qedge_id: f"e{idx}" for idx, qedge_id in enumerate(qgraph["edges"])
+        }
+
+        # qnode ids, then qedge ids
+        columns = [
+            f"{alias}.id AS {alias}"
+            for alias in itertools.chain(
+                self.qnode_aliases.values(), self.qedge_aliases.values()
+            )
+        ]
+        tables = [f"edges AS {alias}" for alias in self.qedge_aliases.values()] + [
+            f"nodes AS {alias}" for alias in self.qnode_aliases.values()
+        ]
+
+        clauses = []
+        values = []
+        for qedge_id, qedge in qgraph["edges"].items():
+            alias = self.qedge_aliases[qedge_id]
+            subject_alias = self.qnode_aliases[qedge["subject"]]
+            object_alias = self.qnode_aliases[qedge["object"]]
+            forward = (
+                f"{alias}.subject == {subject_alias}.id "
+                f"AND {alias}.object == {object_alias}.id"
+            )
+            if (
+                any(
+                    is_symmetric(predicate) for predicate in qedge.get("predicates", [])
+                )
+                and qedge["subject"] != qedge["object"]
+            ):
+                backward = (
+                    f"{alias}.subject == {object_alias}.id "
+                    f"AND {alias}.object == {subject_alias}.id"
+                )
+                clauses.append(f"({forward}) OR ({backward})")
+            else:
+                clauses.append(forward)
+            self._add_conditions(
+                clauses,
+                values,
+                get_constraints(
+                    alias,
+                    qedge,
+                    exclude=("subject", "object", "attribute_constraints"),
+                ),
+            )
+        for qnode_id, alias in self.qnode_aliases.items():
+            self._add_conditions(
+                clauses,
+                values,
+                get_constraints(
+                    alias,
+                    qgraph["nodes"][qnode_id],
+                    exclude=("attribute_constraints", "constraints"),
+                ),
+            )
+
+        self.sql = (
+            "SELECT "
+            + ", ".join(columns)
+            + " FROM "
+            + ", ".join(tables)
+            + " WHERE "
+            + " AND ".join(f"({clause})" for clause in clauses)
+        )
+        if limit is not None:
+            self.sql += " LIMIT ?"
+            values.append(limit)
+        self.values = tuple(values)
+
+    @staticmethod
+    def _add_conditions(clauses: List[str], values: List, kwargs: Dict):
+        """Add conditions built from keyword arguments."""
+        if not kwargs:
+            return
+        condition, condition_values = build_conditions(**kwargs)
+        clauses.append(condition)
+        values.extend(condition_values)
+
+    def unknown_column(self, message: str):
+        """Get unrecognized key from an sqlite error message, if any."""
+        match = re.fullmatch(r"no such column: [ne]\d+\.(.*)", message)
+        if match is None:
+            return None
+        return match.group(1)
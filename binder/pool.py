@@ -0,0 +1,182 @@
+"""Read-only SQLite connection pool."""
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional, Set, Tuple, Union
+
+import aiosqlite
+
+from ._contextlib import asynccontextmanager
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """Pool of read-only connections to an SQLite database file.
+
+    Connections are opened on demand, up to size, and reused across
+    requests. They are reopened by refresh() if the file is replaced.
+    """
+
+    def __init__(
+        self,
+        database_file: str,
+        size: int = 4,
+        mmap_size: int = 2**28,
+        cache_size: int = -(2**16),
+        shared_cache: bool = False,
+        cached_statements: int = 256,
+    ):
+        """Initialize.
+
+        mmap_size is in bytes. cache_size follows PRAGMA cache_size:
+        positive values are pages, negative values are KiB.
+        cached_statements sizes each connection's prepared statement cache.
+        """
+        if size < 1:
+            raise ValueError("size should be at least 1")
+        self.database_file = database_file
+        self.size = size
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.shared_cache = shared_cache
+        self.cached_statements = cached_statements
+        self._connections: List[aiosqlite.Connection] = []
+        self._connecting = 0
+        self._idle: Optional[asyncio.Queue] = None
+        # database signature when the connections were opened
+        self._signature: Optional[Tuple] = None
+        # connections to a replaced file, closed when released
+        self._retired: Set[aiosqlite.Connection] = set()
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Open read-only connection."""
+        uri = Path(self.database_file).absolute().as_uri() + "?mode=ro"
+        if self.shared_cache:
+            uri += "&cache=shared"
+        if self._signature is None:
+            self._signature = database_signature(self.database_file)
+        self._connecting += 1
+        try:
+            db = aiosqlite.connect(
+                uri, uri=True, cached_statements=self.cached_statements
+            )
+            # do not keep the interpreter alive if the pool is never closed
+            db.daemon = True
+            await db
+            await db.execute("PRAGMA query_only = ON")
+            await db.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+            await db.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        finally:
+            self._connecting -= 1
+        self._connections.append(db)
+        return db
+
+    @property
+    def _full(self) -> bool:
+        """Determine whether no more connections may be opened."""
+        return len(self._connections) + self._connecting >= self.size
+
+    async def acquire(self) -> aiosqlite.Connection:
+        """Check out a connection, opening one if none are idle."""
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+        if self._idle.empty() and not self._full:
+            return await self._connect()
+        return await self._idle.get()
+
+    async def try_acquire(self) -> Optional[aiosqlite.Connection]:
+        """Check out a connection if one is idle or may be opened, else None."""
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+        if not self._idle.empty():
+            return self._idle.get_nowait()
+        if not self._full:
+            return await self._connect()
+        return None
+
+    def release(self, db: aiosqlite.Connection):
+        """Return a connection to the pool."""
+        if db in self._retired:
+            self._retired.discard(db)
+            asyncio.ensure_future(db.close())
+            return
+        if db not in self._connections:
+            # the pool was closed while the connection was checked out
+            return
+        self._idle.put_nowait(db)
+
+    @asynccontextmanager
+    async def connection(self):
+        """Check out a connection for the duration of the context."""
+        db = await self.acquire()
+        try:
+            yield db
+        finally:
+            self.release(db)
+
+    async def open(self):
+        """Open all connections up front."""
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+        while not self._full:
+            self._idle.put_nowait(await self._connect())
+        LOGGER.debug(
+            "Opened %d connections to %s", len(self._connections), self.database_file
+        )
+
+    async def refresh(self) -> bool:
+        """Reopen connections if the database file changed since they were
+        opened, as when it is replaced; return whether it did.
+
+        Connections checked out meanwhile are closed when released.
+        """
+        signature = database_signature(self.database_file)
+        if self._signature is None or signature in (None, self._signature):
+            return False
+        self._signature = signature
+        LOGGER.info("Reopening connections to changed %s", self.database_file)
+        connections, self._connections = self._connections, []
+        idle = []
+        while self._idle is not None and not self._idle.empty():
+            idle.append(self._idle.get_nowait())
+        self._retired.update(db for db in connections if db not in idle)
+        for db in idle:
+            await db.close()
+        await self.open()
+        return True
+
+    async def close(self):
+        """Close all connections."""
+        connections, self._connections = self._connections, []
+        connections += self._retired
+        self._retired = set()
+        self._idle = None
+        self._signature = None
+        for db in connections:
+            await db.close()
+
+
+def database_signature(
+    database_file: Union[str, aiosqlite.Connection, ConnectionPool],
+) -> Optional[Tuple]:
+    """Identify the current state of a database file.
+
+    Returns None for connections and in-memory databases, whose changes
+    cannot be detected.
+    """
+    if isinstance(database_file, ConnectionPool):
+        database_file = database_file.database_file
+    if not isinstance(database_file, str) or database_file == ":memory:":
+        return None
+    try:
+        stat = os.stat(database_file)
+    except FileNotFoundError:
+        return None
+    return (
+        os.path.abspath(database_file),
+        stat.st_ino,
+        stat.st_mtime_ns,
+        stat.st_size,
+    )
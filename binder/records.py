@@ -0,0 +1,45 @@
+"""Knowledge graph records."""
+from typing import Any, Dict
+
+
+class KEdge:
+    """Knowledge graph edge, as bound during lookup.
+
+    Fields can also be read by key, as from the TRAPI edge it becomes.
+    """
+
+    __slots__ = ("subject", "predicate", "object")
+
+    def __init__(self, subject: str, predicate: str, object: str):
+        """Initialize."""
+        self.subject = subject
+        self.predicate = predicate
+        self.object = object
+
+    def __getitem__(self, key: str) -> str:
+        """Get field."""
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        """Compare fields."""
+        if not isinstance(other, KEdge):
+            return NotImplemented
+        return (self.subject, self.predicate, self.object) == (
+            other.subject,
+            other.predicate,
+            other.object,
+        )
+
+    def __repr__(self):
+        """Represent kedge."""
+        return f"KEdge({self.subject!r}, {self.predicate!r}, {self.object!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get TRAPI edge."""
+        return {
+            "subject": self.subject,
+            "predicate": self.predicate,
+            "object": self.object,
+        }
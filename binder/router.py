@@ -1,62 +1,247 @@
 """FastAPI router."""
+import json
 import logging
-from typing import Union
+import os
+from typing import Any, AsyncIterator, Dict, Hashable, Optional, Union
 
 import aiosqlite
-from fastapi import Depends, APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException
+import fastapi.responses
 from reasoner_pydantic import Query, Response
 
-from .build_db import add_data
-from .engine import KnowledgeProvider
+from ._contextlib import asynccontextmanager
+from .cache import ResultCache
+from .encoding import encode_query_graph, encode_response, encoded_response
+from .engine import KnowledgeProvider, prepare_qgraph
+from .memory import InMemoryKnowledgeProvider
+from .metrics import QueryMetrics
+from .pool import ConnectionPool, database_signature
+from .util import load_biolink_hierarchy
+from .workers import WorkerPool
 
 LOGGER = logging.getLogger(__name__)
+# per-query timings and counts
+METRICS_LOGGER = logging.getLogger("binder.metrics")
+
+# results per chunk of streamed responses
+STREAM_BATCH_SIZE = 256
+
+
+@asynccontextmanager
+async def open_kp(
+    database_file: Union[str, aiosqlite.Connection, ConnectionPool],
+    **kwargs,
+):
+    """Open knowledge provider, checking out a pooled connection if given.
+
+    Idle connections of the pool may also be used for parts of the query.
+    The pool is first refreshed, in case the database file was replaced.
+    """
+    if isinstance(database_file, ConnectionPool):
+        pool = database_file
+        await pool.refresh()
+        kwargs.setdefault(
+            "name", os.path.splitext(os.path.basename(pool.database_file))[0]
+        )
+        async with pool.connection() as db:
+            async with KnowledgeProvider(db, pool=pool, **kwargs) as kp:
+                yield kp
+    else:
+        async with KnowledgeProvider(database_file, **kwargs) as kp:
+            yield kp
+
+
+def qgraph_key(qgraph: Dict[str, Any]) -> Hashable:
+    """Get key identifying the results of a query graph.
+
+    This is the canonical form of the normalized query graph, which is
+    immutable, so keys of cached results cannot change.
+    """
+    return prepare_qgraph(qgraph).canonical()
+
+
+async def stream_lookup(
+    database_file: Union[str, aiosqlite.Connection, ConnectionPool],
+    query_graph: Any,
+    qgraph: Dict[str, Any],
+    max_results: Optional[int] = None,
+    timeout: Optional[float] = None,
+    **kwargs,
+) -> AsyncIterator[bytes]:
+    """Generate serialized TRAPI message as results are found.
+
+    Results are emitted STREAM_BATCH_SIZE at a time, followed by the
+    knowledge graph of the kedges they bind and any logs.
+    """
+    async with open_kp(database_file, **kwargs) as kp:
+        metrics = kp.metrics
+        with metrics.timer("serialize"):
+            chunk = b'{"message": {"query_graph": ' + encode_query_graph(query_graph)
+        yield chunk
+        yield b', "results": ['
+        kgraph = {"nodes": dict(), "edges": dict()}
+        batch = []
+        separator = b""
+        async for result, kedges in kp.iter_results(qgraph, max_results, timeout):
+            kgraph["edges"].update(kedges)
+            with metrics.timer("serialize"):
+                batch.append(json.dumps(result))
+            if len(batch) >= STREAM_BATCH_SIZE:
+                yield separator + ", ".join(batch).encode()
+                batch = []
+                separator = b", "
+        if batch:
+            yield separator + ", ".join(batch).encode()
+        await kp.finish_kgraph(kgraph)
+        with metrics.timer("serialize"):
+            chunk = b'], "knowledge_graph": ' + json.dumps(kgraph).encode()
+        yield chunk
+        yield b'}, "logs": ' + json.dumps(kp.logs).encode() + b"}"
+    log_metrics(metrics)
+
+
+def log_metrics(metrics: QueryMetrics):
+    """Log query metrics as a structured record."""
+    record = metrics.as_dict()
+    METRICS_LOGGER.info(
+        "Query metrics: %s", json.dumps(record), extra={"metrics": record}
+    )
 
 
 def get_kp(
-    database_file: Union[str, aiosqlite.Connection],
+    database_file: Union[str, aiosqlite.Connection, ConnectionPool],
     **kwargs,
 ):
     """Get KP dependable."""
 
     async def kp_dependable():
         """Get knowledge provider."""
-        async with KnowledgeProvider(database_file, **kwargs) as kp:
+        async with open_kp(database_file, **kwargs) as kp:
             yield kp
 
     return kp_dependable
 
 
 def kp_router(
-    database_file: Union[str, aiosqlite.Connection] = ":memory:",
+    database_file: Union[str, aiosqlite.Connection, ConnectionPool] = ":memory:",
+    pool_size: int = 4,
+    preload_biolink: bool = False,
+    result_cache_size: int = 0,
+    result_cache_bytes: int = 2**27,
+    result_cache_ttl: Optional[float] = 300.0,
+    streaming: bool = False,
+    max_results: Optional[int] = None,
+    timeout: Optional[float] = None,
+    server_timing: bool = False,
+    workers: int = 0,
     **kwargs,
 ):
-    """Add KP to server."""
-    router = APIRouter()
+    """Add KP to server.
 
-    @router.post("/query", response_model=Response)
-    async def answer_question(
+    pool_size: read-only connections to a database file; 0 opens one per
+        request.
+    preload_biolink: load the Biolink model at startup.
+    result_cache_size, result_cache_bytes, result_cache_ttl: bounds of the
+        lookup result cache, which is off when result_cache_size is 0.
+    streaming: send lookup results as they are found.
+    max_results, timeout: bounds on each lookup.
+    server_timing: return timings in a Server-Timing header.
+    workers: answer lookups in this many processes.
+    Other keyword arguments are passed to each KnowledgeProvider.
+    """
+    if isinstance(database_file, str) and database_file != ":memory:" and pool_size > 0:
+        database_file = ConnectionPool(
+            database_file,
+            size=pool_size,
+            cached_statements=kwargs.get("cached_statements", 256),
+        )
+    on_startup = []
+    on_shutdown = []
+    if isinstance(database_file, ConnectionPool):
+        on_startup.append(database_file.open)
+        on_shutdown.append(database_file.close)
+    if preload_biolink:
+        on_startup.append(load_biolink_hierarchy)
+    worker_pool = None
+    if workers > 0:
+        if not isinstance(database_file, ConnectionPool):
+            raise ValueError("workers require a database file and pool_size > 0")
+        worker_pool = WorkerPool(database_file, workers, **kwargs)
+        on_startup.append(worker_pool.open)
+        on_shutdown.append(worker_pool.close)
+    router = APIRouter(on_startup=on_startup, on_shutdown=on_shutdown)
+
+    result_cache = None
+    if result_cache_size > 0:
+        result_cache = ResultCache(
+            maxsize=result_cache_size,
+            maxbytes=result_cache_bytes,
+            ttl=result_cache_ttl,
+        )
+    # database signature of cached results
+    result_cache_signature = [None]
+
+    async def answer(
         query: Query,
-    ) -> Response:
-        """Get results for query graph."""
+        metrics: QueryMetrics,
+    ) -> Union[Response, fastapi.responses.Response]:
+        """Get results for query graph, recording metrics."""
+        kp_kwargs = {**kwargs, "metrics": metrics}
+        query_graph = query.message.query_graph
         query = query.dict(exclude_unset=True)
         workflow = query.get("workflow", [{"id": "lookup"}])
         if len(workflow) > 1:
             raise HTTPException(400, "Binder does not support workflows of length >1")
         operation = workflow[0]
         qgraph = query["message"]["query_graph"]
+        key = None
         if operation["id"] == "lookup":
-            async with KnowledgeProvider(database_file, **kwargs) as kp:
-                kgraph, results = await kp.get_results(qgraph)
+            signature = None
+            if result_cache is not None:
+                signature = database_signature(database_file)
+            if signature is not None:
+                if signature != result_cache_signature[0]:
+                    result_cache.clear()
+                    result_cache_signature[0] = signature
+                with metrics.timer("normalize"):
+                    key = (signature, qgraph_key(qgraph))
+                encoded = result_cache.get(key)
+                if encoded is not None:
+                    metrics.count("result_cache_hits")
+                    with metrics.timer("serialize"):
+                        return encoded_response(query_graph, encoded)
+            if streaming:
+                return fastapi.responses.StreamingResponse(
+                    stream_lookup(
+                        database_file,
+                        query_graph,
+                        qgraph,
+                        max_results,
+                        timeout,
+                        **kp_kwargs,
+                    ),
+                    media_type="application/json",
+                )
+            if worker_pool is not None:
+                encoded, complete = await worker_pool.answer(
+                    qgraph, max_results, timeout, metrics
+                )
+                if key is not None and complete:
+                    result_cache.put(key, encoded, sum(len(part) for part in encoded))
+                with metrics.timer("serialize"):
+                    return encoded_response(query_graph, encoded)
+            async with open_kp(database_file, **kp_kwargs) as kp:
+                kgraph, results = await kp.get_results(qgraph, max_results, timeout)
         elif operation["id"] == "bind":
             kgraph = query["message"]["knowledge_graph"]
-            knodes = [
+            knodes = (
                 {
                     "id": knode_id,
                     "category": knode.get("categories", ["biolink:NamedThing"])[0],
                 }
                 for knode_id, knode in kgraph["nodes"].items()
-            ]
-            kedges = [
+            )
+            kedges = (
                 {
                     "id": kedge_id,
                     "subject": kedge["subject"],
@@ -64,11 +249,10 @@ def kp_router(
                     "object": kedge["object"],
                 }
                 for kedge_id, kedge in kgraph["edges"].items()
-            ]
+            )
 
-            async with KnowledgeProvider(":memory:", **kwargs) as kp:
-                await add_data(kp.db, knodes, kedges)
-                kgraph, results = await kp.get_results(qgraph)
+            kp = InMemoryKnowledgeProvider(knodes, kedges, **kp_kwargs)
+            kgraph, results = await kp.get_results(qgraph, max_results, timeout)
         else:
             raise HTTPException(400, f"Unsupported operation {operation}")
 
@@ -77,29 +261,62 @@ def kp_router(
                 "knowledge_graph": kgraph,
                 "results": results,
                 "query_graph": qgraph,
-            }
+            },
+            "logs": kp.logs,
         }
-        return Response.parse_obj(response)
+        with metrics.timer("validate"):
+            response = Response.parse_obj(response)
+        # serialize here, so that it is timed alike on every path
+        with metrics.timer("serialize"):
+            encoded = encode_response(response)
+            if key is not None and not kp.logs:
+                result_cache.put(key, encoded, sum(len(part) for part in encoded))
+            return encoded_response(query_graph, encoded)
+
+    @router.post("/query", response_model=Response)
+    async def answer_question(
+        query: Query,
+    ) -> Response:
+        """Get results for query graph."""
+        metrics = QueryMetrics()
+        with metrics.timer("total"):
+            response = await answer(query, metrics)
+        if isinstance(response, fastapi.responses.StreamingResponse):
+            # metrics are logged at the end of the stream
+            return response
+        log_metrics(metrics)
+        if server_timing:
+            response.headers["Server-Timing"] = metrics.server_timing()
+        return response
+
+    # (database signature, meta knowledge graph)
+    meta_kg_cache = [None, None]
 
     @router.get("/meta_knowledge_graph")
-    async def get_metakg(
-        kp: KnowledgeProvider = Depends(get_kp(database_file)),
-    ):
-        """Get meta knowledge graph."""
-        meta_kg = {
-            "edges": [
-                {
-                    "subject": op["subject_category"],
-                    "predicate": op["predicate"],
-                    "object": op["object_category"],
-                }
-                for op in await kp.get_operations()
-            ],
-            "nodes": {
-                category: {"id_prefixes": data}
-                for category, data in (await kp.get_curie_prefixes()).items()
-            },
-        }
+    async def get_metakg():
+        """Get meta knowledge graph.
+
+        This is cached until the database file changes.
+        """
+        signature = database_signature(database_file)
+        if signature is not None and meta_kg_cache[0] == signature:
+            return meta_kg_cache[1]
+        async with open_kp(database_file, **kwargs) as kp:
+            meta_kg = {
+                "edges": [
+                    {
+                        "subject": op["subject_category"],
+                        "predicate": op["predicate"],
+                        "object": op["object_category"],
+                    }
+                    for op in await kp.get_operations()
+                ],
+                "nodes": {
+                    category: {"id_prefixes": data}
+                    for category, data in (await kp.get_curie_prefixes()).items()
+                },
+            }
+        meta_kg_cache[:] = [signature, meta_kg]
         return meta_kg
 
     return router
@@ -0,0 +1,102 @@
+"""Cardinality estimates for query planning."""
+from typing import Dict, Mapping, Optional
+
+
+class Statistics:
+    """Table statistics.
+
+    Any of these may be unknown, in which case estimates fall back to
+    counting ids.
+    """
+
+    def __init__(
+        self,
+        num_nodes: Optional[int] = None,
+        num_edges: Optional[int] = None,
+        category_counts: Optional[Dict[str, int]] = None,
+        predicate_counts: Optional[Dict[str, int]] = None,
+        predicate_selectivity: Optional[float] = None,
+    ):
+        """Initialize.
+
+        predicate_selectivity is the average fraction of edges having any
+        one predicate, for when per-predicate counts are unknown.
+        """
+        self.num_nodes = num_nodes
+        self.num_edges = num_edges
+        self.category_counts = category_counts
+        self.predicate_counts = predicate_counts
+        self.predicate_selectivity = predicate_selectivity
+
+    @classmethod
+    def from_stat1(cls, rows) -> "Statistics":
+        """Get statistics from sqlite_stat1 rows of (tbl, idx, stat).
+
+        The first number of each stat is the number of rows in the table.
+        For edges_subject_predicate and edges_object_predicate, the next
+        are the average number of rows per subject (object) and per
+        subject (object) and predicate.
+        """
+        num_rows = dict()
+        predicate_selectivity = None
+        for table, index, stat in rows:
+            numbers = [int(number) for number in stat.split()[:3]]
+            num_rows[table] = max(num_rows.get(table, 0), numbers[0])
+            if (
+                index in ("edges_subject_predicate", "edges_object_predicate")
+                and len(numbers) == 3
+                and numbers[1] > 0
+            ):
+                # the side with more edges per node better reflects how
+                # many predicates there are
+                predicate_selectivity = min(
+                    predicate_selectivity or 1.0, numbers[2] / numbers[1]
+                )
+        return cls(
+            num_nodes=num_rows.get("nodes", None),
+            num_edges=num_rows.get("edges", None),
+            predicate_selectivity=predicate_selectivity,
+        )
+
+    def node_selectivity(self, qnode: Mapping) -> float:
+        """Estimate fraction of nodes matching qnode."""
+        ids = qnode.get("ids", None)
+        if ids is not None:
+            if not self.num_nodes:
+                return float(len(ids))
+            return min(1.0, len(ids) / self.num_nodes)
+        categories = qnode.get("categories", None)
+        if categories and self.category_counts is not None and self.num_nodes:
+            count = sum(
+                self.category_counts.get(category, 0) for category in categories
+            )
+            return min(1.0, count / self.num_nodes)
+        return 1.0
+
+    def edge_count(self, qedge: Mapping) -> float:
+        """Estimate number of edges matching qedge predicates."""
+        predicates = qedge.get("predicates", None)
+        if self.num_edges is None:
+            return 1.0
+        if not predicates:
+            return float(self.num_edges)
+        if self.predicate_counts is not None:
+            return float(
+                sum(self.predicate_counts.get(predicate, 0) for predicate in predicates)
+            )
+        if self.predicate_selectivity is not None:
+            return self.num_edges * min(
+                1.0, len(predicates) * self.predicate_selectivity
+            )
+        return float(self.num_edges)
+
+    def estimate(self, qedge: Mapping, subject: Mapping, object: Mapping) -> float:
+        """Estimate number of kedges matching qedge and its qnodes.
+
+        Constraints are assumed to be independent.
+        """
+        return (
+            self.edge_count(qedge)
+            * self.node_selectivity(subject)
+            * self.node_selectivity(object)
+        )
@@ -1,14 +1,37 @@
 """Query graph utilities."""
+from functools import lru_cache
+import json
+import operator
 import re
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
 
-from bmt import Toolkit
+if TYPE_CHECKING:
+    from bmt import Toolkit
 
-BMT = Toolkit()
+_BMT: Optional["Toolkit"] = None
 
 
-def get_subcategories(category):
-    """Get sub-categories, according to the Biolink model."""
-    categories = BMT.get_descendants(category, formatted=True, reflexive=True) or [
+def get_toolkit() -> "Toolkit":
+    """Get the Biolink model toolkit, loading the model on first use."""
+    global _BMT
+    if _BMT is None:
+        from bmt import Toolkit
+
+        _BMT = Toolkit()
+    return _BMT
+
+
+def __getattr__(name):
+    """Load BMT lazily."""
+    if name == "BMT":
+        return get_toolkit()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _get_subcategories(toolkit: "Toolkit", category: str) -> List[str]:
+    """Get sub-categories from the Biolink model toolkit."""
+    categories = toolkit.get_descendants(category, formatted=True, reflexive=True) or [
         category
     ]
     if "biolink:SmallMolecule" in categories:
@@ -16,6 +39,96 @@ def get_subcategories(category):
     return [category.replace("_", "") for category in categories]
 
 
+def _get_subpredicates(toolkit: "Toolkit", predicate: str) -> List[str]:
+    """Get sub-predicates from the Biolink model toolkit."""
+    curies = toolkit.get_descendants(predicate, formatted=True, reflexive=True) or [
+        predicate
+    ]
+    return ["biolink:" + camelcase_to_snakecase(curie[8:]) for curie in curies]
+
+
+def _is_symmetric(toolkit: "Toolkit", predicate: str) -> bool:
+    """Determine from the Biolink model toolkit whether predicate is symmetric."""
+    el = toolkit.get_element(predicate)
+    if el is None:
+        return False
+    return el.symmetric
+
+
+class BiolinkHierarchy:
+    """Precomputed Biolink model hierarchy.
+
+    Descendants of every class and slot, and symmetry of every slot, are
+    computed once and keyed by CURIE. Other inputs are passed through to
+    the toolkit.
+    """
+
+    def __init__(self, toolkit: "Toolkit"):
+        """Initialize."""
+        self.toolkit = toolkit
+        subcategories = dict()
+        for name in toolkit.get_all_classes():
+            # the reflexive descendant comes last
+            curie = toolkit.get_descendants(name, formatted=True)[-1]
+            subcategories[curie] = tuple(_get_subcategories(toolkit, curie))
+        subpredicates = dict()
+        symmetric = dict()
+        for name in toolkit.get_all_slots():
+            curie = toolkit.get_descendants(name, formatted=True)[-1]
+            subpredicates[curie] = tuple(_get_subpredicates(toolkit, curie))
+            symmetric[curie] = _is_symmetric(toolkit, curie)
+        self.subcategories = MappingProxyType(subcategories)
+        self.subpredicates = MappingProxyType(subpredicates)
+        self.symmetric = MappingProxyType(symmetric)
+
+    def get_subcategories(self, category: str) -> List[str]:
+        """Get sub-categories."""
+        categories = self.subcategories.get(category, None)
+        if categories is None:
+            return _get_subcategories(self.toolkit, category)
+        return list(categories)
+
+    def get_subpredicates(self, predicate: str) -> List[str]:
+        """Get sub-predicates."""
+        predicates = self.subpredicates.get(predicate, None)
+        if predicates is None:
+            return _get_subpredicates(self.toolkit, predicate)
+        return list(predicates)
+
+    def is_symmetric(self, predicate: str) -> bool:
+        """Determine whether predicate is symmetric."""
+        symmetric = self.symmetric.get(predicate, None)
+        if symmetric is None:
+            return _is_symmetric(self.toolkit, predicate)
+        return symmetric
+
+
+_HIERARCHY: Optional[BiolinkHierarchy] = None
+
+
+def load_biolink_hierarchy() -> BiolinkHierarchy:
+    """(Re)build the Biolink hierarchy table.
+
+    This happens on first use; call it directly to warm up or reload.
+    """
+    global _HIERARCHY
+    _HIERARCHY = BiolinkHierarchy(get_toolkit())
+    return _HIERARCHY
+
+
+def get_biolink_hierarchy() -> BiolinkHierarchy:
+    """Get the Biolink hierarchy table, building it if necessary."""
+    if _HIERARCHY is None:
+        return load_biolink_hierarchy()
+    return _HIERARCHY
+
+
+def get_subcategories(category):
+    """Get sub-categories, according to the Biolink model."""
+    return get_biolink_hierarchy().get_subcategories(category)
+
+
+@lru_cache(maxsize=4096)
 def camelcase_to_snakecase(string):
     """Convert CamelCase to snake_case."""
     return re.sub(r"(?<!^)(?=[A-Z])", "_", string).lower()
@@ -23,51 +136,41 @@ def camelcase_to_snakecase(string):
 
 def get_subpredicates(predicate):
     """Get sub-predicates, according to the Biolink model."""
-    curies = BMT.get_descendants(predicate, formatted=True, reflexive=True) or [
-        predicate
-    ]
-    return ["biolink:" + camelcase_to_snakecase(curie[8:]) for curie in curies]
+    return get_biolink_hierarchy().get_subpredicates(predicate)
 
 
 def is_symmetric(predicate):
     """Determine whether predicate is symmetric."""
-    el = BMT.get_element(predicate)
-    if el is None:
-        return False
-    return el.symmetric
+    return get_biolink_hierarchy().is_symmetric(predicate)
 
 
 class NoAnswersException(Exception):
     """No answers to question."""
 
 
+KEY_MAP = {
+    "predicates": "predicate",
+    "categories": "category",
+    "ids": "id",
+}
+
+
 def build_conditions(**conditions):
     """Build SQL WHERE clause.
 
     conditions uses a format similar to this:
     https://docs.mongodb.com/manual/tutorial/query-documents/
+
+    Clauses are cached by shape, and $in lists are padded to a power of
+    two, or bound as one JSON array if long, so that SQLite can reuse
+    prepared statements and long lists take one parameter.
     """
-    conditions, values = zip(
-        *[build_condition(key, value) for key, value in conditions.items()]
-    )
-    # flatten values tuples
-    values = tuple(value for tup in values for value in tup)
-    if len(conditions) == 1:
-        return conditions[0], values
-    return " AND ".join(f"({condition})" for condition in conditions), values
+    return build_template(condition_shape(conditions)), condition_values(conditions)
 
 
 def build_condition(key, value):
     """Build SQL WHERE clause."""
-    if key == "$or":
-        conditions, values = zip(
-            *[build_conditions(**alternative) for alternative in value]
-        )
-        # flatten values tuples
-        values = tuple(value for tup in values for value in tup)
-        return " OR ".join(f"({condition})" for condition in conditions), values
-    predicate, values = build_predicate(value)
-    return f"{key} " + predicate, values
+    return build_conditions(**{key: value})
 
 
 PREDICATES = {
@@ -81,13 +184,120 @@ PREDICATES = {
 }
 
 
-def build_predicate(predicate):
-    """Build predicate."""
+# longer $in lists are bound as one JSON array
+MAX_INLINE_VALUES = 32
+
+
+def _bucket(arity: int) -> Optional[int]:
+    """Round $in arity up to a power of two, or None for a JSON array."""
+    if arity > MAX_INLINE_VALUES:
+        return None
+    return 1 << (arity - 1).bit_length() if arity > 1 else arity
+
+
+def _parse_predicate(predicate) -> Tuple[Optional[str], Any]:
+    """Get operator (None for equality) and operand."""
     if not isinstance(predicate, dict):
-        return f"== ?", (predicate,)
+        return None, predicate
     if len(predicate) > 1:
         raise ValueError(f"Cannot parse {predicate}")
-    key, value = next((key, value) for key, value in predicate.items())
-    if key == "$in":
-        return "in ({})".format(", ".join("?" for _ in range(len(value)))), tuple(value)
-    return f"{PREDICATES[key]} ?", (value,)
+    return next(iter(predicate.items()))
+
+
+def condition_shape(conditions: Dict[str, Any]) -> Tuple:
+    """Get hashable shape of conditions.
+
+    This is a tuple of (key, operator, number of placeholders, or None
+    for one JSON array) and ("$or", shapes of alternatives).
+    """
+    shape = []
+    for key, value in conditions.items():
+        if key == "$or":
+            shape.append(("$or", tuple(condition_shape(alt) for alt in value)))
+            continue
+        op, operand = _parse_predicate(value)
+        shape.append((key, op, _bucket(len(operand)) if op == "$in" else 1))
+    return tuple(shape)
+
+
+def condition_values(conditions: Dict[str, Any]) -> Tuple:
+    """Get values for the placeholders of build_template()."""
+    values = []
+    for key, value in conditions.items():
+        if key == "$or":
+            for alternative in value:
+                values.extend(condition_values(alternative))
+            continue
+        op, operand = _parse_predicate(value)
+        if op == "$in":
+            bucket = _bucket(len(operand))
+            if bucket is None:
+                values.append(json.dumps(list(operand)))
+                continue
+            values.extend(operand)
+            # repeat the last value to fill the bucket
+            values.extend(operand[-1:] * (bucket - len(operand)))
+        else:
+            values.append(operand)
+    return tuple(values)
+
+
+@lru_cache(maxsize=1024)
+def build_template(shape: Tuple) -> str:
+    """Build SQL WHERE clause, with placeholders, from condition shape."""
+    conditions = []
+    for element in shape:
+        if element[0] == "$or":
+            conditions.append(
+                " OR ".join(f"({build_template(alt)})" for alt in element[1])
+            )
+            continue
+        key, op, arity = element
+        if op is None:
+            conditions.append(f"{key} == ?")
+        elif op == "$in" and arity is None:
+            conditions.append(f"{key} in (SELECT value FROM json_each(?))")
+        elif op == "$in":
+            conditions.append(
+                "{0} in ({1})".format(key, ", ".join("?" for _ in range(arity)))
+            )
+        else:
+            conditions.append(f"{key} {PREDICATES[op]} ?")
+    if len(conditions) == 1:
+        return conditions[0]
+    return " AND ".join(f"({condition})" for condition in conditions)
+
+
+OPERATORS = {
+    "$in": lambda a, b: a in b,
+    "$lt": operator.lt,
+    "$gt": operator.gt,
+    "$le": operator.le,
+    "$ge": operator.ge,
+    "$eq": operator.eq,
+    "$ne": operator.ne,
+}
+
+
+def check_conditions(values: Callable[[str], Any], **conditions) -> bool:
+    """Evaluate conditions, in the format of build_conditions(), in Python.
+
+    values maps a column (e.g. "edge.predicate") to its value and raises
+    KeyError for unknown columns. As in SQL, NULL matches nothing.
+    """
+    return all(check_condition(values, key, value) for key, value in conditions.items())
+
+
+def check_condition(values: Callable[[str], Any], key, value) -> bool:
+    """Evaluate condition in Python."""
+    if key == "$or":
+        return any(check_conditions(values, **alternative) for alternative in value)
+    if not isinstance(value, dict):
+        value = {"$eq": value}
+    if len(value) > 1:
+        raise ValueError(f"Cannot parse {value}")
+    op, operand = next((op, operand) for op, operand in value.items())
+    actual = values(key)
+    if actual is None or operand is None:
+        return False
+    return OPERATORS[op](actual, operand)
@@ -0,0 +1,156 @@
+"""Process pool for answering queries off the event loop."""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from reasoner_pydantic import Response
+
+from .encoding import encode_response
+from .engine import KnowledgeProvider
+from .metrics import QueryMetrics
+from .pool import ConnectionPool
+from .util import load_biolink_hierarchy
+
+LOGGER = logging.getLogger(__name__)
+
+# event loop, connection pool, and provider options of this worker process
+_WORKER: Dict[str, Any] = dict()
+
+
+def _initialize(pool_kwargs: Dict[str, Any], kp_kwargs: Dict[str, Any]):
+    """Open a read-only connection and load the Biolink model."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    pool = ConnectionPool(size=1, **pool_kwargs)
+    loop.run_until_complete(pool.open())
+    load_biolink_hierarchy()
+    _WORKER.update(loop=loop, pool=pool, kp_kwargs=kp_kwargs)
+
+
+def _ready() -> bool:
+    """Do nothing, once the worker is initialized."""
+    return True
+
+
+async def _lookup(
+    qgraph: Dict[str, Any],
+    max_results: Optional[int],
+    timeout: Optional[float],
+    metrics: QueryMetrics,
+) -> Tuple[Tuple[bytes, bytes], bool]:
+    """Get serialized response and whether results are complete."""
+    pool = _WORKER["pool"]
+    await pool.refresh()
+    async with pool.connection() as db:
+        async with KnowledgeProvider(
+            db, pool=pool, metrics=metrics, **_WORKER["kp_kwargs"]
+        ) as kp:
+            kgraph, results = await kp.get_results(qgraph, max_results, timeout)
+    response = {
+        "message": {
+            "knowledge_graph": kgraph,
+            "results": results,
+            "query_graph": qgraph,
+        },
+        "logs": kp.logs,
+    }
+    with metrics.timer("validate"):
+        response = Response.parse_obj(response)
+    with metrics.timer("serialize"):
+        encoded = encode_response(response)
+    return encoded, not kp.logs
+
+
+def _answer(
+    qgraph: Dict[str, Any],
+    max_results: Optional[int],
+    timeout: Optional[float],
+) -> Tuple[Tuple[bytes, bytes], bool, QueryMetrics]:
+    """Answer lookup in a worker process."""
+    metrics = QueryMetrics()
+    encoded, complete = _WORKER["loop"].run_until_complete(
+        _lookup(qgraph, max_results, timeout, metrics)
+    )
+    return encoded, complete, metrics
+
+
+class WorkerPool:
+    """Processes answering lookups against a database file.
+
+    Each holds its own read-only connection and Biolink tables, and
+    returns validated responses serialized as by encode_response().
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        size: int,
+        **kwargs,
+    ):
+        """Initialize.
+
+        Worker connections are configured like those of pool.
+        Keyword arguments are passed to each KnowledgeProvider.
+        """
+        if size < 1:
+            raise ValueError("size should be at least 1")
+        self.size = size
+        self.pool_kwargs = {
+            "database_file": pool.database_file,
+            "mmap_size": pool.mmap_size,
+            "cache_size": pool.cache_size,
+            "cached_statements": pool.cached_statements,
+        }
+        self.kp_kwargs = {
+            "name": os.path.splitext(os.path.basename(pool.database_file))[0],
+            **kwargs,
+        }
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def open(self):
+        """Start and initialize worker processes."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                self.size,
+                # forking would copy the threads of open connections
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_initialize,
+                initargs=(self.pool_kwargs, self.kp_kwargs),
+            )
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(self._executor, _ready) for _ in range(self.size))
+        )
+        LOGGER.debug("Started %d workers", self.size)
+
+    async def answer(
+        self,
+        qgraph: Dict[str, Any],
+        max_results: Optional[int] = None,
+        timeout: Optional[float] = None,
+        metrics: Optional[QueryMetrics] = None,
+    ) -> Tuple[Tuple[bytes, bytes], bool]:
+        """Get serialized response and whether results are complete.
+
+        Worker timings and counts are added to metrics, if given.
+        """
+        if self._executor is None:
+            await self.open()
+        loop = asyncio.get_running_loop()
+        encoded, complete, worker_metrics = await loop.run_in_executor(
+            self._executor, _answer, qgraph, max_results, timeout
+        )
+        if metrics is not None:
+            for name, seconds in worker_metrics.timings.items():
+                metrics.timings[name] += seconds
+            metrics.counts.update(worker_metrics.counts)
+        return encoded, complete
+
+    async def close(self):
+        """Stop worker processes."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
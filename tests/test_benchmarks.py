@@ -0,0 +1,71 @@
+"""Test benchmark suite."""
+import json
+
+import pytest
+
+from benchmarks.generate import generate_graph, GraphSpec
+from benchmarks.run import benchmark, compare, main
+
+from .logging_setup import setup_logger
+
+
+setup_logger()
+
+
+def test_generate():
+    """Test that generated graphs are reproducible and skewed."""
+    spec = GraphSpec(num_nodes=50, num_edges=200, seed=1)
+    nodes, edges = generate_graph(spec)
+    assert (nodes, edges) == generate_graph(spec)
+    assert len(nodes) == 50
+    assert len(edges) == 200
+    degree = {node["id"]: 0 for node in nodes}
+    for edge in edges:
+        degree[edge["subject"]] += 1
+        degree[edge["object"]] += 1
+    assert degree[nodes[0]["id"]] > degree[nodes[-1]["id"]]
+
+
+@pytest.mark.asyncio
+async def test_benchmark(tmp_path):
+    """Test benchmark report."""
+    spec = GraphSpec(num_nodes=50, num_edges=200)
+    report = await benchmark(
+        spec, str(tmp_path / "benchmark.db"), repeat=2, names=["one_hop", "bind"]
+    )
+    json.dumps(report)
+    assert set(report["queries"]) == {"one_hop", "bind"}
+    one_hop = report["queries"]["one_hop"]
+    assert set(one_hop) == {"kp_join", "kp_recursive", "kp_frontier", "router"}
+    # the join, kedges, and knodes
+    assert one_hop["kp_join"]["sql_statements"] == 3
+    assert one_hop["kp_join"]["results"] > 0
+    assert report["queries"]["bind"]["router"]["results"] > 0
+
+    assert compare(report, report, 1.0) == []
+    slower = json.loads(json.dumps(report))
+    slower["queries"]["one_hop"]["router"]["p50_ms"] *= 2
+    assert compare(slower, report, 1.5) == ["one_hop/router"]
+
+
+def test_main(tmp_path):
+    """Test command-line regression check."""
+    args = [
+        "--nodes",
+        "50",
+        "--edges",
+        "200",
+        "--repeat",
+        "1",
+        "--queries",
+        "symmetric",
+    ]
+    output = str(tmp_path / "report.json")
+    assert main(args + ["--output", output]) == 0
+    with open(output, "r") as stream:
+        report = json.load(stream)
+    for measurements in report["queries"]["symmetric"].values():
+        measurements["p50_ms"] /= 1000
+    with open(output, "w") as stream:
+        json.dump(report, stream)
+    assert main(args + ["--baseline", output]) == 1
@@ -0,0 +1,111 @@
+from binder.bindings import BindingTable, Interner
+
+
+def signature(table):
+    return sorted(
+        (
+            tuple(sorted((key, b[0]["id"]) for key, b in r["node_bindings"].items())),
+            tuple(sorted((key, b[0]["id"]) for key, b in r["edge_bindings"].items())),
+        )
+        for r in table.results()
+    )
+
+
+def test_interner():
+    intern = Interner()
+    assert intern("X:0") == 0
+    assert intern("X:1") == 1
+    assert intern("X:0") == 0
+    assert len(intern) == 2
+    assert intern.strings == ["X:0", "X:1"]
+
+
+def test_join():
+    interner = Interner()
+    table = BindingTable(interner)
+    assert table.results() == [{"node_bindings": {}, "edge_bindings": {}}]
+
+    table = table.join("e01", "n0", "n1", [("X:0", "X:1", "a"), ("X:0", "X:2", "b")])
+    table = table.join(
+        "e12",
+        "n1",
+        "n2",
+        [("X:1", "X:3", "c"), ("X:1", "X:4", "d"), ("X:5", "X:6", "e")],
+    )
+    assert len(table) == 2
+    assert table.values("n1") == {"X:1"}
+    assert table.edge_ids() == {"a", "c", "d"}
+    assert signature(table) == [
+        (
+            (("n0", "X:0"), ("n1", "X:1"), ("n2", "X:3")),
+            (("e01", "a"), ("e12", "c")),
+        ),
+        (
+            (("n0", "X:0"), ("n1", "X:1"), ("n2", "X:4")),
+            (("e01", "a"), ("e12", "d")),
+        ),
+    ]
+
+    # self-loop qedges match only self-loop kedges
+    loop = BindingTable(interner).join(
+        "e00", "n0", "n0", [("X:0", "X:0", "f"), ("X:0", "X:1", "g")]
+    )
+    assert loop.edge_ids() == {"f"}
+
+    assert not table.join("e23", "n2", "n3", [])
+    assert table.head(1).edge_ids() == {"a", "c"}
+
+    limited = table.join(
+        "e23", "n2", "n3", [("X:3", "X:7", "h"), ("X:3", "X:8", "i")], 1
+    )
+    assert len(limited) == 1
+    assert limited.edge_ids() == {"a", "c", "h"}
+
+
+def test_concat_product():
+    interner = Interner()
+    tables = [
+        BindingTable(interner).bind({"n0": "X:0", "n1": f"X:{idx}"}, {"e01": kedge_id})
+        for idx, kedge_id in ((1, "a"), (2, "b"))
+    ]
+    left = BindingTable.concat(interner, [BindingTable.empty(interner), *tables])
+    assert len(left) == 2
+    assert left.values("n1") == {"X:1", "X:2"}
+    assert not BindingTable.concat(interner, [])
+
+    right = BindingTable(interner).join(
+        "e02",
+        "n0",
+        "n2",
+        [("X:0", "X:3", "c"), ("X:0", "X:4", "d"), ("X:0", "X:5", "e")],
+    )
+    product = BindingTable.product(interner, [left, right])
+    assert len(product) == 6
+    assert {
+        (r["edge_bindings"]["e01"][0]["id"], r["edge_bindings"]["e02"][0]["id"])
+        for r in product.results()
+    } == {(x, y) for x in "ab" for y in "cde"}
+
+    # combinations are generated in order, later tables varying fastest
+    limited = BindingTable.product(interner, [left, right], 4)
+    assert [
+        (r["edge_bindings"]["e01"][0]["id"], r["edge_bindings"]["e02"][0]["id"])
+        for r in limited.results()
+    ] == [("a", "c"), ("a", "d"), ("a", "e"), ("b", "c")]
+    assert len(product.results(3)) == 3
+    assert not BindingTable.product(interner, [left, BindingTable.empty(interner)])
+
+
+def test_from_rows():
+    interner = Interner()
+    table = BindingTable.from_rows(
+        interner, ["n0", "n1"], ["e01"], [("X:0", "X:1", "a"), ("X:0", "X:2", "b")]
+    )
+    assert len(table) == 2
+    assert table.values("n1") == {"X:1", "X:2"}
+    assert table.edge_ids() == {"a", "b"}
+
+    empty = BindingTable.from_rows(interner, ["n0", "n1"], ["e01"], [])
+    assert not empty
+    assert set(empty.node_columns) == {"n0", "n1"}
+    assert BindingTable.concat(interner, [table, empty]).edge_ids() == {"a", "b"}
@@ -0,0 +1,178 @@
+"""Test building databases."""
+import asyncio
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+
+import aiosqlite
+import pytest
+
+from binder.build_db import (
+    add_data,
+    add_data_from_string,
+    load_files,
+    main,
+    prepare_db,
+)
+from binder.engine import KnowledgeProvider
+
+from .logging_setup import setup_logger
+
+
+setup_logger()
+
+
+@pytest.fixture
+async def connection():
+    """Return FastAPI app fixture."""
+    async with aiosqlite.connect(":memory:") as connection:
+        yield connection
+
+
+async def get_indexes(connection: aiosqlite.Connection):
+    """Get names of explicitly-created indexes."""
+    async with connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    ) as cursor:
+        return {row[0] for row in await cursor.fetchall()}
+
+
+@pytest.mark.asyncio
+async def test_schema(connection: aiosqlite.Connection):
+    """Test that tables are keyed and indexed."""
+    data = """
+        MONDO:0005148(( category biolink:Disease ))
+        MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+        CHEBI:6801(( category biolink:ChemicalSubstance ))
+    """
+    await add_data_from_string(connection, data=data)
+    await add_data_from_string(connection, data=data)
+
+    async with connection.execute("SELECT COUNT(*) FROM nodes") as cursor:
+        assert (await cursor.fetchone())[0] == 2
+    assert await get_indexes(connection) == {
+        "edges_subject_predicate",
+        "edges_object_predicate",
+    }
+    async with connection.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM nodes WHERE id = ?", ["CHEBI:6801"]
+    ) as cursor:
+        plan = " ".join(row[-1] for row in await cursor.fetchall())
+    assert "USING INDEX" in plan
+
+
+@pytest.mark.asyncio
+async def test_without_rowid(connection: aiosqlite.Connection):
+    """Test WITHOUT ROWID tables."""
+    await add_data(
+        connection,
+        [{"id": "CHEBI:6801", "category": "biolink:ChemicalSubstance"}],
+        [],
+        without_rowid=True,
+    )
+    async with connection.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'nodes'"
+    ) as cursor:
+        assert (await cursor.fetchone())[0].endswith("WITHOUT ROWID")
+
+
+async def create_legacy_db(database_file: str):
+    """Create database without keys or indexes."""
+    async with aiosqlite.connect(database_file) as connection:
+        await connection.execute("CREATE TABLE nodes (id text, category text)")
+        await connection.execute(
+            "CREATE TABLE edges (id text, subject text, predicate text, object text)"
+        )
+        await connection.commit()
+
+
+def test_prepare_legacy():
+    """Test preparing a database built without keys or indexes."""
+    with tempfile.NamedTemporaryFile() as f:
+        asyncio.run(create_legacy_db(f.name))
+
+        main(["prepare", f.name])
+
+        with sqlite3.connect(f.name) as connection:
+            indexes = {
+                row[0]
+                for row in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index'"
+                )
+            }
+        assert indexes == {
+            "nodes_id",
+            "edges_id",
+            "edges_subject_predicate",
+            "edges_object_predicate",
+        }
+
+
+@pytest.mark.asyncio
+async def test_covering_indexes(connection: aiosqlite.Connection):
+    """Test that edge indexes of older databases are replaced."""
+    await connection.execute(
+        "CREATE TABLE edges (id text, subject text, predicate text, object text)"
+    )
+    await connection.execute(
+        "CREATE INDEX edges_object_predicate ON edges (object, predicate)"
+    )
+    await prepare_db(connection)
+    for index, columns in (
+        ("edges_subject_predicate", ["subject", "predicate", "object"]),
+        ("edges_object_predicate", ["object", "predicate", "subject"]),
+    ):
+        async with connection.execute(
+            "SELECT name FROM pragma_index_info(?) ORDER BY seqno", [index]
+        ) as cursor:
+            assert [row[0] for row in await cursor.fetchall()] == columns
+
+
+@pytest.mark.asyncio
+async def test_load_files(connection: aiosqlite.Connection):
+    """Test streaming KGX-style files."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        nodes_file = os.path.join(tmpdir, "nodes.tsv")
+        with open(nodes_file, "w") as stream:
+            stream.write("id\tcategory\tname\n")
+            stream.write("MONDO:0005148\tbiolink:Disease|biolink:NamedThing\tT2D\n")
+            stream.write("CHEBI:6801\tbiolink:ChemicalSubstance\tmetformin\n")
+            stream.write("CHEBI:6801\tbiolink:Drug\tmetformin\n")
+        edges_file = os.path.join(tmpdir, "edges.jsonl.gz")
+        with gzip.open(edges_file, "wt") as stream:
+            stream.write(
+                json.dumps(
+                    {
+                        "subject": "CHEBI:6801",
+                        "predicate": "biolink:treats",
+                        "object": "MONDO:0005148",
+                    }
+                )
+                + "\n"
+            )
+        counts = await load_files(
+            connection,
+            nodes_file=nodes_file,
+            edges_file=edges_file,
+            chunk_size=1,
+        )
+    assert counts == {"nodes": 3, "edges": 1}
+    async with connection.execute(
+        "SELECT category FROM nodes WHERE id = 'CHEBI:6801'"
+    ) as cursor:
+        assert await cursor.fetchall() == [("biolink:ChemicalSubstance",)]
+    assert {"nodes_id", "edges_id"} <= await get_indexes(connection)
+
+    kp = KnowledgeProvider(connection)
+    kgraph, results = await kp.get_results(
+        {
+            "nodes": {
+                "n0": {"ids": ["CHEBI:6801"]},
+                "n1": {"categories": ["biolink:Disease"]},
+            },
+            "edges": {"e01": {"subject": "n0", "object": "n1"}},
+        }
+    )
+    assert len(results) == 1
@@ -1,7 +1,10 @@
 """Test generating SQL conditions."""
+import json
+import sqlite3
+
 import pytest
 
-from binder.util import build_conditions
+from binder.util import build_conditions, build_template, MAX_INLINE_VALUES
 
 from .logging_setup import setup_logger
 
@@ -43,6 +46,37 @@ def test_condition():
     ) == ("a in (?, ?)", (1, 2))
 
 
+def test_in_buckets():
+    """Test that $in lists are padded to share statements."""
+    assert build_conditions(
+        **{
+            "a": {"$in": [1, 2, 3]},
+        }
+    ) == ("a in (?, ?, ?, ?)", (1, 2, 3, 3))
+    build_template.cache_clear()
+    for length in range(5, 9):
+        sql, values = build_conditions(a={"$in": list(range(length))}, b=1)
+        assert sql == "(a in (?, ?, ?, ?, ?, ?, ?, ?)) AND (b == ?)"
+        assert len(values) == 9
+        assert values[-1] == 1
+    assert build_template.cache_info().misses == 1
+
+
+def test_long_in():
+    """Test that long $in lists are bound as one parameter."""
+    ids = [f"X:{idx}" for idx in range(MAX_INLINE_VALUES + 1)]
+    sql, values = build_conditions(a={"$in": ids}, b=1)
+    assert sql == "(a in (SELECT value FROM json_each(?))) AND (b == ?)"
+    assert values == (json.dumps(ids), 1)
+
+    with sqlite3.connect(":memory:") as connection:
+        connection.execute("CREATE TABLE t (a text, b integer)")
+        connection.executemany("INSERT INTO t VALUES (?, 1)", [("X:0",), ("Y:0",)])
+        assert connection.execute(
+            f"SELECT a FROM t WHERE {sql}", values
+        ).fetchall() == [("X:0",)]
+
+
 def test_malformed_conditions():
     """Test malformed conditions."""
     with pytest.raises(ValueError):
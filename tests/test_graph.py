@@ -1,4 +1,6 @@
-from binder.graph import Graph
+import pickle
+
+from binder.graph import Graph, SubGraph
 
 
 def test_graph():
@@ -12,3 +14,135 @@ def test_graph():
         },
     )
     assert graph.connected_edges("n0") == (["e01"], [])
+
+
+def test_subgraph():
+    graph = Graph(
+        nodes={"n0": {"ids": ["X:0"]}, "n1": {}, "n2": {}},
+        edges={
+            "e01": {"subject": "n0", "object": "n1"},
+            "e12": {"subject": "n1", "object": "n2"},
+        },
+    )
+    subgraph = SubGraph.from_graph(graph)
+    assert subgraph.node_ids() == ["n0", "n1", "n2"]
+
+    pinned = subgraph.pin("e01", {"n0": ("X:0",), "n1": ("X:1",)})
+    assert pinned.qedges is subgraph.qedges
+    assert pinned.edge_ids == ("e12",)
+    # n0 is orphaned, so its pin is dropped
+    assert dict(pinned.pins) == {"n1": ("X:1",)}
+    assert pinned["nodes"]["n1"] == {"ids": ["X:1"]}
+    assert list(pinned["edges"]) == ["e12"]
+    assert "ids" not in graph["nodes"]["n1"]
+
+
+def test_components():
+    graph = Graph(
+        nodes={
+            "n0": {"ids": ["X:0"]},
+            "n1": {},
+            "n2": {},
+            "n3": {"ids": ["X:3", "X:4"]},
+            "n4": {},
+        },
+        edges={
+            "e01": {"subject": "n0", "object": "n1"},
+            "e12": {"subject": "n1", "object": "n2"},
+            "e03": {"subject": "n0", "object": "n3"},
+            "e43": {"subject": "n4", "object": "n3"},
+        },
+    )
+    subgraph = SubGraph.from_graph(graph)
+    # n3 may be bound to either id, so it joins e03 and e43
+    assert [component.edge_ids for component in subgraph.components()] == [
+        ("e01", "e12"),
+        ("e03", "e43"),
+    ]
+
+    pinned = subgraph.pin("e03", {"n0": ("X:0",), "n3": ("X:3",)})
+    components = pinned.components()
+    assert [component.edge_ids for component in components] == [
+        ("e01", "e12"),
+        ("e43",),
+    ]
+    assert dict(components[0].pins) == {"n0": ("X:0",)}
+    assert dict(components[1].pins) == {"n3": ("X:3",)}
+
+    assert pinned.pin("e01", {"n0": ("X:0",), "n1": ("X:1",)}).components()[
+        0
+    ].edge_ids == ("e12",)
+    # n3 is no longer bound by e43, but n0 is bound to one id
+    assert len(subgraph.pin("e43", {}).components()) == 2
+
+
+def test_canonical():
+    graph = Graph(
+        nodes={"n0": {"ids": ["X:0", "X:1"]}, "n1": {}},
+        edges={"e01": {"subject": "n0", "object": "n1"}},
+    )
+    other = Graph(
+        edges={"e01": {"object": "n1", "subject": "n0"}},
+        nodes={"n1": {}, "n0": {"ids": ["X:1", "X:0"]}},
+    )
+    assert graph.canonical() == other.canonical()
+    assert graph != other
+
+    key = other.canonical()
+    other["nodes"]["n1"]["ids"] = ["X:2"]
+    assert other.canonical() != key
+    assert key == graph.canonical()
+
+    other["nodes"] = {"n0": {"ids": ["X:0", "X:1"]}, "n1": {"is_set": True}}
+    graph["nodes"]["n1"]["is_set"] = 1
+    assert graph.canonical() != other.canonical()
+
+
+def test_hash():
+    graph = Graph(
+        nodes={"n0": {"ids": ["X:0"]}, "n1": {}},
+        edges={"e01": {"subject": "n0", "object": "n1"}},
+    )
+    other = Graph(
+        edges={"e01": {"object": "n1", "subject": "n0"}},
+        nodes={"n1": {}, "n0": {"ids": ["X:0"]}},
+    )
+    assert graph == other
+    assert hash(graph) == hash(other)
+    assert len({graph, other}) == 1
+
+
+def test_adjacency():
+    graph = Graph(
+        nodes={"n0": {}, "n1": {}, "n2": {}, "n3": {}},
+        edges={
+            "e01": {"subject": "n0", "object": "n1"},
+            "e21": {"subject": "n2", "object": "n1"},
+        },
+    )
+    assert graph.connected_edges("n1") == ([], ["e01", "e21"])
+    assert graph.degree("n1") == 2
+    assert graph.degree("n3") == 0
+    graph.remove_orphaned()
+    assert list(graph["nodes"]) == ["n0", "n1", "n2"]
+
+    graph["edges"] = {"e01": {"subject": "n0", "object": "n1"}}
+    assert graph.degree("n2") == 0
+    graph["edges"]["e11"] = {"subject": "n1", "object": "n1"}
+    assert graph.connected_edges("n1") == (["e11"], ["e01", "e11"])
+
+    # the index is kept until edges change, in place or not
+    assert graph.adjacency() is graph.adjacency()
+    graph["edges"].pop("e01")
+    graph.remove_orphaned()
+    assert list(graph["nodes"]) == ["n1"]
+    graph.update(edges={"e12": {"subject": "n1", "object": "n2"}})
+    assert graph.connected_edges("n1") == (["e12"], [])
+    graph["edges"].setdefault("e21", {"subject": "n2", "object": "n1"})
+    assert graph.degree("n1") == 2
+
+    copied = pickle.loads(pickle.dumps(graph))
+    assert copied == graph
+    copied["edges"].clear()
+    assert copied.degree("n1") == 0
+    assert graph.degree("n1") == 2
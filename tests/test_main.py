@@ -5,7 +5,8 @@ import pytest
 from reasoner_pydantic import KnowledgeGraph, Result
 
 from binder.build_db import add_data_from_string
-from binder.engine import KnowledgeProvider
+from binder.engine import custom_row_factory, KnowledgeProvider
+from binder.util import NoAnswersException
 
 from .logging_setup import setup_logger
 
@@ -237,3 +238,54 @@ async def test_symmetric(connection: aiosqlite.Connection):
     assert len(results) == 1
     assert results[0]["node_bindings"]["n0"][0]["id"] == "MONDO:0005148"
     assert results[0]["node_bindings"]["n1"][0]["id"] == "CHEBI:6801"
+
+
+@pytest.mark.asyncio
+async def test_get_knodes(connection: aiosqlite.Connection):
+    """Test batched knode fetching."""
+    await add_data_from_string(
+        connection,
+        data="\n".join(
+            f"CHEBI:{idx}(( category biolink:ChemicalSubstance ))"
+            for idx in range(1200)
+        ),
+    )
+    kp = KnowledgeProvider(connection)
+    knodes = await kp.get_knodes(f"CHEBI:{idx}" for idx in range(1200))
+    assert len(knodes) == 1200
+    assert knodes["CHEBI:7"]["categories"] == ["biolink:ChemicalSubstance"]
+
+    with pytest.raises(NoAnswersException):
+        await kp.get_knodes(["CHEBI:7", "CHEBI:xxx"])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("row_factory", [None, custom_row_factory])
+async def test_shared_connection(connection: aiosqlite.Connection, row_factory):
+    """Test that the caller's row factory is left as it is."""
+    await add_data_from_string(
+        connection,
+        data="""
+            MONDO:0005148(( category biolink:Disease ))
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+            CHEBI:6801(( category biolink:ChemicalSubstance ))
+        """,
+    )
+    connection.row_factory = row_factory
+    for strategy in ("join", "recursive", "frontier"):
+        kp = KnowledgeProvider(connection, strategy=strategy)
+        kgraph, results = await kp.get_results(
+            {
+                "nodes": {
+                    "n0": {"ids": ["MONDO:0005148"]},
+                    "n1": {"categories": ["biolink:ChemicalSubstance"]},
+                },
+                "edges": {"e10": {"subject": "n1", "object": "n0"}},
+            }
+        )
+        assert len(results) == 1
+        assert await kp.get_operations()
+    assert connection.row_factory is row_factory
+    async with connection.execute("SELECT id FROM nodes ORDER BY id") as cursor:
+        row = await cursor.fetchone()
+    assert row == ({"id": "CHEBI:6801"} if row_factory else ("CHEBI:6801",))
@@ -0,0 +1,81 @@
+"""Test in-memory knowledge provider."""
+import aiosqlite
+import pytest
+
+from binder.build_db import add_data, get_data_from_string
+from binder.engine import KnowledgeProvider
+from binder.memory import InMemoryKnowledgeProvider
+
+from .logging_setup import setup_logger
+from .test_planner import result_signature
+
+
+setup_logger()
+
+DATA = """
+    MONDO:0005148(( category biolink:Disease ))
+    NCBIGene:123(( category biolink:Gene ))
+    NCBIGene:456(( category biolink:Gene ))
+    CHEBI:6801(( category biolink:ChemicalSubstance ))
+    MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+    CHEBI:6801<-- predicate biolink:affected_by --NCBIGene:123
+    NCBIGene:123<-- predicate biolink:affected_by --MONDO:0005148
+    NCBIGene:456<-- predicate biolink:affected_by --MONDO:0005148
+    NCBIGene:456-- predicate biolink:related_to -->CHEBI:6801
+"""
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "qgraph",
+    [
+        {
+            "nodes": {
+                "n0": {"categories": ["biolink:Disease"], "ids": ["MONDO:0005148"]},
+                "n1": {"categories": ["biolink:ChemicalSubstance"]},
+                "n2": {"categories": ["biolink:Gene"]},
+            },
+            "edges": {
+                "e10": {
+                    "subject": "n1",
+                    "object": "n0",
+                    "predicates": ["biolink:treats"],
+                },
+                "e21": {"subject": "n2", "object": "n1"},
+            },
+        },
+        {
+            "nodes": {
+                "n0": {"ids": ["CHEBI:6801"]},
+                "n1": {"categories": ["biolink:Gene"], "foo": "bar"},
+            },
+            "edges": {"e01": {"subject": "n0", "object": "n1"}},
+        },
+        {
+            "nodes": {
+                "n0": {"ids": ["CHEBI:6801", "MONDO:0005148"]},
+                "n1": {"categories": ["biolink:Gene"]},
+            },
+            "edges": {
+                "e01": {
+                    "subject": "n0",
+                    "object": "n1",
+                    "predicates": ["biolink:related_to"],
+                },
+            },
+        },
+    ],
+)
+async def test_matches_sqlite(qgraph):
+    """Test that in-memory and SQLite providers agree."""
+    nodes, edges = await get_data_from_string(DATA)
+    async with aiosqlite.connect(":memory:") as connection:
+        await add_data(connection, nodes, edges)
+        _, expected = await KnowledgeProvider(connection).get_results(qgraph)
+
+    kp = InMemoryKnowledgeProvider(nodes, edges)
+    kgraph, results = await kp.get_results(qgraph)
+    assert result_signature(results) == result_signature(expected)
+    for result in results:
+        for bindings in result["node_bindings"].values():
+            assert bindings[0]["id"] in kgraph["nodes"]
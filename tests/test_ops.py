@@ -79,3 +79,36 @@ async def test_prefixes(connection: aiosqlite.Connection):
         "biolink:Disease": ["MONDO"],
         "biolink:ChemicalSubstance": ["CHEBI"],
     }
+
+
+@pytest.mark.asyncio
+async def test_ops_without_metadata(connection: aiosqlite.Connection):
+    """Test KP operations for databases built without metadata tables."""
+    await add_data_from_string(
+        connection,
+        data="""
+        MONDO:0005148(( category biolink:Disease ))
+        MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+        CHEBI:6801(( category biolink:ChemicalSubstance ))
+        CHEBI:6802(( category biolink:ChemicalSubstance ))
+        CHEBI:6802-- predicate biolink:treats -->MONDO:0005148
+        """,
+    )
+    kp = KnowledgeProvider(connection)
+    ops = await kp.get_operations()
+    prefixes = await kp.get_curie_prefixes()
+
+    await connection.execute("DROP TABLE meta_operations")
+    await connection.execute("DROP TABLE meta_prefixes")
+    assert (
+        await kp.get_operations()
+        == ops
+        == [
+            {
+                "subject_category": "biolink:ChemicalSubstance",
+                "predicate": "biolink:treats",
+                "object_category": "biolink:Disease",
+            }
+        ]
+    )
+    assert await kp.get_curie_prefixes() == prefixes
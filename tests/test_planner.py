@@ -0,0 +1,582 @@
+"""Test join planner."""
+import sqlite3
+
+import aiosqlite
+import pytest
+
+from binder.build_db import add_data_from_string
+from binder.cache import Memo
+import binder.engine
+from binder.engine import KnowledgeProvider
+from binder.graph import Graph
+from binder.metrics import QueryMetrics
+from binder.records import KEdge
+from binder.planner import is_joinable
+
+from .logging_setup import setup_logger
+
+
+setup_logger()
+
+
+@pytest.fixture
+async def connection():
+    """Return FastAPI app fixture."""
+    async with aiosqlite.connect(":memory:") as connection:
+        yield connection
+
+
+def result_signature(results):
+    """Get order-insensitive representation of results."""
+    return sorted(
+        (
+            tuple(
+                sorted(
+                    (key, bindings[0]["id"])
+                    for key, bindings in result["node_bindings"].items()
+                )
+            ),
+            tuple(
+                sorted(
+                    (key, bindings[0]["id"])
+                    for key, bindings in result["edge_bindings"].items()
+                )
+            ),
+        )
+        for result in results
+    )
+
+
+@pytest.mark.asyncio
+async def test_two_hop(connection: aiosqlite.Connection):
+    """Test that join and recursive strategies agree on a two-hop query."""
+    await add_data_from_string(
+        connection,
+        data="""
+            MONDO:0005148(( category biolink:Disease ))
+            CHEBI:6801(( category biolink:ChemicalSubstance ))
+            CHEBI:6802(( category biolink:ChemicalSubstance ))
+            NCBIGene:123(( category biolink:Gene ))
+            NCBIGene:456(( category biolink:Gene ))
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6802
+            CHEBI:6801-- predicate biolink:affects -->NCBIGene:123
+            CHEBI:6801-- predicate biolink:affects -->NCBIGene:456
+            CHEBI:6802-- predicate biolink:affects -->NCBIGene:456
+        """,
+    )
+    qgraph = {
+        "nodes": {
+            "disease": {
+                "categories": ["biolink:Disease"],
+                "ids": ["MONDO:0005148"],
+            },
+            "drug": {
+                "categories": ["biolink:ChemicalSubstance"],
+            },
+            "gene": {
+                "categories": ["biolink:Gene"],
+            },
+        },
+        "edges": {
+            "treats": {
+                "subject": "drug",
+                "object": "disease",
+                "predicates": ["biolink:treats"],
+            },
+            "affects": {
+                "subject": "drug",
+                "object": "gene",
+                "predicates": ["biolink:affects"],
+            },
+        },
+    }
+    kgraph, results = await KnowledgeProvider(connection).get_results(qgraph)
+    _, expected = await KnowledgeProvider(connection, strategy="recursive").get_results(
+        qgraph
+    )
+    assert len(results) == 3
+    assert result_signature(results) == result_signature(expected)
+    assert len(kgraph["nodes"]) == 5
+    assert all(
+        knode["categories"] for knode in kgraph["nodes"].values()
+    ), "knodes should have categories"
+
+
+@pytest.mark.asyncio
+async def test_join_unrecognized_key(connection: aiosqlite.Connection):
+    """Test unrecognized key in joined query."""
+    await add_data_from_string(
+        connection,
+        data="""
+            MONDO:0005148(( category biolink:Disease ))
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+            CHEBI:6801(( category biolink:ChemicalSubstance ))
+        """,
+    )
+    qgraph = {
+        "nodes": {
+            "n0": {"ids": ["MONDO:0005148"]},
+            "n1": {"foo": "bar"},
+        },
+        "edges": {
+            "e01": {
+                "subject": "n1",
+                "object": "n0",
+                "predicates": ["biolink:treats"],
+            },
+        },
+    }
+    kgraph, results = await KnowledgeProvider(connection).get_results(qgraph)
+    assert not results
+
+
+def test_joinable():
+    """Test detection of query graphs that can be joined."""
+    assert not is_joinable({"nodes": {"n0": {"ids": ["X:1"]}}, "edges": {}})
+    assert not is_joinable(
+        {
+            "nodes": {"n0": {}, "n1": {}},
+            "edges": {"e01": {"subject": "n0", "object": "n1"}},
+        }
+    )
+    assert not is_joinable(
+        {
+            "nodes": {"n0": {"ids": ["X:1"]}, "n1": {}, "n2": {}, "n3": {}},
+            "edges": {
+                "e01": {"subject": "n0", "object": "n1"},
+                "e23": {"subject": "n2", "object": "n3"},
+            },
+        }
+    )
+    assert is_joinable(
+        {
+            "nodes": {"n0": {"ids": ["X:1"]}, "n1": {}, "n2": {}},
+            "edges": {
+                "e01": {"subject": "n0", "object": "n1"},
+                "e21": {"subject": "n2", "object": "n1"},
+            },
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_flipped_two_hop(connection: aiosqlite.Connection):
+    """Test that strategies agree when a symmetric qedge matches in reverse."""
+    await add_data_from_string(
+        connection,
+        data="""
+            CHEBI:6801(( category biolink:ChemicalSubstance ))
+            NCBIGene:123(( category biolink:Gene ))
+            MONDO:0005148(( category biolink:Disease ))
+            NCBIGene:123-- predicate biolink:related_to -->CHEBI:6801
+            NCBIGene:123-- predicate biolink:related_to -->MONDO:0005148
+        """,
+    )
+    qgraph = {
+        "nodes": {
+            "drug": {"ids": ["CHEBI:6801"]},
+            "gene": {"categories": ["biolink:Gene"]},
+            "disease": {"categories": ["biolink:Disease"]},
+        },
+        "edges": {
+            "e0": {
+                "subject": "drug",
+                "object": "gene",
+                "predicates": ["biolink:related_to"],
+            },
+            "e1": {
+                "subject": "gene",
+                "object": "disease",
+                "predicates": ["biolink:related_to"],
+            },
+        },
+    }
+    _, results = await KnowledgeProvider(connection).get_results(qgraph)
+    _, expected = await KnowledgeProvider(connection, strategy="recursive").get_results(
+        qgraph
+    )
+    assert len(results) == 1
+    assert result_signature(results) == result_signature(expected)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("strategy", ["join", "recursive", "frontier"])
+async def test_symmetric_self_loop(connection: aiosqlite.Connection, strategy: str):
+    """Test that a self-loop kedge matches a symmetric qedge once."""
+    await add_data_from_string(
+        connection,
+        data="""
+            NCBIGene:123(( category biolink:Gene ))
+            NCBIGene:456(( category biolink:Gene ))
+            NCBIGene:123-- predicate biolink:related_to -->NCBIGene:123
+            NCBIGene:123-- predicate biolink:related_to -->NCBIGene:456
+        """,
+    )
+    qgraph = {
+        "nodes": {
+            "n0": {"ids": ["NCBIGene:123"]},
+            "n1": {"categories": ["biolink:Gene"]},
+        },
+        "edges": {
+            "e01": {
+                "subject": "n0",
+                "object": "n1",
+                "predicates": ["biolink:related_to"],
+            },
+        },
+    }
+    _, results = await KnowledgeProvider(connection, strategy=strategy).get_results(
+        qgraph
+    )
+    assert [result["node_bindings"]["n1"][0]["id"] for result in results].count(
+        "NCBIGene:123"
+    ) == 1
+    assert len(results) == 2
+
+
+@pytest.mark.asyncio
+async def test_memo(connection: aiosqlite.Connection):
+    """Test that repeated sub-problems are solved once."""
+    await add_data_from_string(
+        connection,
+        data="""
+            CHEBI:6801(( category biolink:ChemicalSubstance ))
+            CHEBI:6802(( category biolink:ChemicalSubstance ))
+            NCBIGene:123(( category biolink:Gene ))
+            MONDO:0005148(( category biolink:Disease ))
+            CHEBI:6801-- predicate biolink:affects -->NCBIGene:123
+            CHEBI:6802-- predicate biolink:affects -->NCBIGene:123
+            NCBIGene:123-- predicate biolink:related_to -->MONDO:0005148
+        """,
+    )
+    qgraph = {
+        "nodes": {
+            "drug": {"ids": ["CHEBI:6801", "CHEBI:6802"]},
+            "gene": {"categories": ["biolink:Gene"]},
+            "disease": {"categories": ["biolink:Disease"]},
+        },
+        "edges": {
+            "affects": {"subject": "drug", "object": "gene"},
+            "related": {"subject": "gene", "object": "disease"},
+        },
+    }
+    _, expected = await KnowledgeProvider(
+        connection, strategy="recursive", memo_size=0
+    ).get_results(qgraph)
+    memo = Memo()
+    _, results = await KnowledgeProvider(connection).lookup(Graph(qgraph), memo)
+    assert result_signature(results) == result_signature(expected)
+    assert len(results) == 2
+    assert memo.hits == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("strategy", ["join", "recursive", "frontier"])
+async def test_max_results(connection: aiosqlite.Connection, strategy):
+    """Test that lookups stop at max_results or timeout."""
+    await add_data_from_string(
+        connection,
+        data="""
+            MONDO:0005148(( category biolink:Disease ))
+            CHEBI:6801(( category biolink:ChemicalSubstance ))
+            CHEBI:6802(( category biolink:ChemicalSubstance ))
+            CHEBI:6803(( category biolink:ChemicalSubstance ))
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6802
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6803
+        """,
+    )
+    qgraph = {
+        "nodes": {
+            "disease": {"ids": ["MONDO:0005148"]},
+            "drug": {"categories": ["biolink:ChemicalSubstance"]},
+        },
+        "edges": {
+            "treats": {
+                "subject": "drug",
+                "object": "disease",
+                "predicates": ["biolink:treats"],
+            },
+        },
+    }
+    kp = KnowledgeProvider(connection, strategy=strategy)
+    kgraph, results = await kp.get_results(qgraph, max_results=3)
+    assert len(results) == 3
+    assert not kp.logs
+
+    kgraph, results = await kp.get_results(qgraph, max_results=2)
+    assert len(results) == 2
+    assert len(kgraph["edges"]) == 2
+    assert len(kgraph["nodes"]) == 3
+    assert kp.logs[-1]["message"] == "Results truncated at 2"
+
+    kgraph, results = await kp.get_results(qgraph, timeout=0)
+    assert not results
+    assert "timed out" in kp.logs[-1]["message"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("strategy", ["join", "recursive", "frontier"])
+async def test_max_results_reached(connection: aiosqlite.Connection, strategy):
+    """Test that exactly max_results results are not reported as truncated."""
+    await add_data_from_string(
+        connection,
+        data="""
+            MONDO:0005148(( category biolink:Disease ))
+            CHEBI:6801(( category biolink:ChemicalSubstance ))
+            CHEBI:6802(( category biolink:ChemicalSubstance ))
+            CHEBI:6803(( category biolink:ChemicalSubstance ))
+            NCBIGene:123(( category biolink:Gene ))
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6802
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6803
+            CHEBI:6801-- predicate biolink:affects -->NCBIGene:123
+            CHEBI:6802-- predicate biolink:affects -->NCBIGene:123
+        """,
+    )
+    qgraph = {
+        "nodes": {
+            "disease": {"ids": ["MONDO:0005148"]},
+            "drug": {"categories": ["biolink:ChemicalSubstance"]},
+            "gene": {"categories": ["biolink:Gene"]},
+        },
+        "edges": {
+            "treats": {
+                "subject": "drug",
+                "object": "disease",
+                "predicates": ["biolink:treats"],
+            },
+            "affects": {
+                "subject": "drug",
+                "object": "gene",
+                "predicates": ["biolink:affects"],
+            },
+        },
+    }
+    # CHEBI:6803 is a dead end, expanded after both results are found
+    kp = KnowledgeProvider(connection, strategy=strategy)
+    kgraph, results = await kp.get_results(qgraph, max_results=2)
+    assert len(results) == 2
+    assert not kp.logs
+    assert {
+        binding["id"]
+        for result in results
+        for bindings in result["edge_bindings"].values()
+        for binding in bindings
+    } <= set(kgraph["edges"])
+
+    results = [result async for result, _ in kp.iter_results(qgraph, max_results=2)]
+    assert len(results) == 2
+    assert not kp.logs
+
+
+@pytest.mark.asyncio
+async def test_kedge_records(connection: aiosqlite.Connection):
+    """Test that kedges are bound as compact records."""
+    await add_data_from_string(
+        connection,
+        data="""
+            MONDO:0005148(( category biolink:Disease ))
+            CHEBI:6801(( category biolink:ChemicalSubstance ))
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+        """,
+    )
+    kp = KnowledgeProvider(connection)
+    (kedge,) = (await kp.get_kedges(**{"subject.id": "CHEBI:6801"})).values()
+    assert kedge == KEdge("CHEBI:6801", "biolink:treats", "MONDO:0005148")
+    assert kedge["predicate"] == "biolink:treats"
+    with pytest.raises(KeyError):
+        kedge["attributes"]
+
+    kgraph = {"nodes": dict(), "edges": {"x": kedge}}
+    await kp.finish_kgraph(kgraph)
+    assert kgraph["edges"]["x"]["subject"] == "CHEBI:6801"
+    assert kgraph["nodes"]["CHEBI:6801"] == {
+        "categories": ["biolink:ChemicalSubstance"]
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("max_variables", [1, 500])
+async def test_frontier(connection: aiosqlite.Connection, monkeypatch, max_variables):
+    """Test that the frontier strategy agrees, with one query per qedge."""
+    monkeypatch.setattr(binder.engine, "MAX_VARIABLES", max_variables)
+    await add_data_from_string(
+        connection,
+        data="""
+            MONDO:0005148(( category biolink:Disease ))
+            CHEBI:6801(( category biolink:ChemicalSubstance ))
+            CHEBI:6802(( category biolink:ChemicalSubstance ))
+            NCBIGene:123(( category biolink:Gene ))
+            NCBIGene:456(( category biolink:Gene ))
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6802
+            CHEBI:6801-- predicate biolink:affects -->NCBIGene:123
+            CHEBI:6801-- predicate biolink:affects -->NCBIGene:456
+            CHEBI:6802-- predicate biolink:affects -->NCBIGene:456
+            NCBIGene:456-- predicate biolink:related_to -->MONDO:0005148
+            MONDO:0005148-- predicate biolink:related_to -->NCBIGene:123
+        """,
+    )
+    qgraph = {
+        "nodes": {
+            "disease": {"ids": ["MONDO:0005148"]},
+            "drug": {"categories": ["biolink:ChemicalSubstance"]},
+            "gene": {"categories": ["biolink:Gene"]},
+        },
+        "edges": {
+            "treats": {
+                "subject": "drug",
+                "object": "disease",
+                "predicates": ["biolink:treats"],
+            },
+            "affects": {
+                "subject": "drug",
+                "object": "gene",
+                "predicates": ["biolink:affects"],
+            },
+            "related": {
+                "subject": "gene",
+                "object": "disease",
+                "predicates": ["biolink:related_to"],
+            },
+        },
+    }
+    _, expected = await KnowledgeProvider(connection).get_results(qgraph)
+    _, recursive = await KnowledgeProvider(
+        connection, strategy="recursive"
+    ).get_results(qgraph)
+    assert len(expected) == 3
+    assert result_signature(recursive) == result_signature(expected)
+
+    metrics = QueryMetrics()
+    kp = KnowledgeProvider(connection, strategy="frontier", metrics=metrics)
+    kgraph, results = await kp.get_results(qgraph)
+    assert result_signature(results) == result_signature(expected)
+    assert set(kgraph["edges"]) == {
+        binding["id"]
+        for result in results
+        for bindings in result["edge_bindings"].values()
+        for binding in bindings
+    }
+    if max_variables > 1:
+        # one per qedge, the symmetric one in both directions, and knodes
+        assert metrics.counts["sql_statements"] == 5
+
+    # no chemical causes the disease
+    qgraph["edges"]["treats"]["predicates"] = ["biolink:causes"]
+    _, results = await kp.get_results(qgraph)
+    assert results == []
+
+
+@pytest.mark.asyncio
+async def test_frontier_timeout(connection: aiosqlite.Connection, monkeypatch):
+    """Test that the frontier strategy keeps the results found in time."""
+    monkeypatch.setattr(binder.engine, "MAX_VARIABLES", 1)
+    await add_data_from_string(
+        connection,
+        data="""
+            MONDO:0005148(( category biolink:Disease ))
+            CHEBI:6801(( category biolink:ChemicalSubstance ))
+            CHEBI:6802(( category biolink:ChemicalSubstance ))
+            NCBIGene:123(( category biolink:Gene ))
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6802
+            CHEBI:6801-- predicate biolink:affects -->NCBIGene:123
+        """,
+    )
+    qgraph = {
+        "nodes": {
+            "drug": {"ids": ["CHEBI:6801", "CHEBI:6802"]},
+            "disease": {"categories": ["biolink:Disease"]},
+        },
+        "edges": {
+            "treats": {
+                "subject": "drug",
+                "object": "disease",
+                "predicates": ["biolink:treats"],
+            },
+        },
+    }
+    kp = KnowledgeProvider(connection, strategy="frontier")
+    get_kedges = kp.get_kedges
+    calls = []
+
+    async def counted_get_kedges(**kwargs):
+        calls.append(kwargs)
+        return await get_kedges(**kwargs)
+
+    monkeypatch.setattr(kp, "get_kedges", counted_get_kedges)
+    # time runs out after the first of two chunks of drugs
+    monkeypatch.setattr(
+        binder.engine,
+        "_expired",
+        lambda deadline: deadline is not None and len(calls) >= 1,
+    )
+    kgraph, results = await kp.get_results(qgraph, timeout=60)
+    assert len(calls) == 1
+    assert len(results) == 1
+    assert len(kgraph["edges"]) == 1
+    assert "timed out" in kp.logs[-1]["message"]
+
+    # results are found only once every qedge is reached
+    qgraph["nodes"]["gene"] = {"categories": ["biolink:Gene"]}
+    qgraph["edges"]["affects"] = {
+        "subject": "drug",
+        "object": "gene",
+        "predicates": ["biolink:affects"],
+    }
+    calls.clear()
+    kgraph, results = await kp.get_results(qgraph, timeout=60)
+    assert not results
+    assert "timed out" in kp.logs[-1]["message"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(
+    not hasattr(sqlite3.Connection, "setlimit"), reason="requires Python 3.11"
+)
+async def test_frontier_parameters(connection: aiosqlite.Connection):
+    """Test that frontier statements stay below 999 host parameters."""
+    await connection._execute(
+        connection._conn.setlimit, sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999
+    )
+    await add_data_from_string(
+        connection,
+        data="""
+            MONDO:0005148(( category biolink:Disease ))
+            MONDO:0005149(( category biolink:Disease ))
+            CHEBI:6801(( category biolink:ChemicalSubstance ))
+            CHEBI:6802(( category biolink:ChemicalSubstance ))
+            MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+            MONDO:0005149<-- predicate biolink:treats --CHEBI:6802
+        """,
+    )
+    qgraph = {
+        "nodes": {
+            "drug": {
+                "ids": ["CHEBI:6801", "CHEBI:6802"]
+                + [f"CHEBI:{idx}" for idx in range(298)]
+            },
+            "disease": {
+                "ids": ["MONDO:0005148"] + [f"MONDO:{idx}" for idx in range(299)]
+            },
+        },
+        "edges": {
+            "treats": {
+                "subject": "drug",
+                "object": "disease",
+                "predicates": ["biolink:treats"],
+            },
+        },
+    }
+    kp = KnowledgeProvider(connection, strategy="frontier")
+    kgraph, results = await kp.get_results(qgraph)
+    assert result_signature(results) == [
+        (
+            (("disease", "MONDO:0005148"), ("drug", "CHEBI:6801")),
+            (("treats", next(iter(kgraph["edges"]))),),
+        )
+    ]
+    assert len(kgraph["edges"]) == 1
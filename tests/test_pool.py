@@ -0,0 +1,328 @@
+"""Test connection pool."""
+import os
+import sqlite3
+import tempfile
+
+import aiosqlite
+from fastapi import FastAPI
+import httpx
+import pytest
+
+from binder.build_db import add_data_from_string
+from binder.cache import ResultCache
+from binder.engine import KnowledgeProvider
+from binder.metrics import QueryMetrics
+from binder.pool import ConnectionPool
+from binder.router import kp_router
+
+from .logging_setup import setup_logger
+from .test_planner import result_signature
+
+
+setup_logger()
+
+
+@pytest.fixture
+async def database_file():
+    """Return path to database file with data."""
+    with tempfile.NamedTemporaryFile() as f:
+        async with aiosqlite.connect(f.name) as connection:
+            await add_data_from_string(
+                connection,
+                data="""
+                    MONDO:0005148(( category biolink:Disease ))
+                    MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+                    CHEBI:6801(( category biolink:ChemicalSubstance ))
+                """,
+            )
+        yield f.name
+
+
+@pytest.mark.asyncio
+async def test_read_only(database_file):
+    """Test that pooled connections are read-only and reused."""
+    pool = ConnectionPool(database_file, size=2)
+    async with pool.connection() as db:
+        with pytest.raises(sqlite3.OperationalError):
+            await db.execute("DELETE FROM nodes")
+        first = db
+    async with pool.connection() as db:
+        assert db is first
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pooled_router(database_file):
+    """Test serving queries from a pool."""
+    pool = ConnectionPool(database_file, size=1)
+    name = os.path.splitext(os.path.basename(database_file))[0]
+    app = FastAPI()
+    app.include_router(kp_router(pool))
+    request = {
+        "message": {
+            "query_graph": {
+                "nodes": {
+                    "n0": {"categories": ["biolink:ChemicalSubstance"]},
+                    "n1": {"ids": ["MONDO:0005148"]},
+                },
+                "edges": {
+                    "e01": {
+                        "subject": "n0",
+                        "object": "n1",
+                        "predicates": ["biolink:treats"],
+                    },
+                },
+            }
+        }
+    }
+    async with httpx.AsyncClient(app=app, base_url="http://kp") as client:
+        for _ in range(3):
+            response = await client.post("/query", json=request)
+            assert response.status_code == 200
+            assert response.json()["message"]["results"]
+            kedges = response.json()["message"]["knowledge_graph"]["edges"]
+            assert all(
+                kedge["attributes"][0]["value"] == f"infores:{name}"
+                for kedge in kedges.values()
+            )
+        response = await client.get("/meta_knowledge_graph")
+        assert response.status_code == 200
+    assert len(pool._connections) == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_metakg_cache(database_file):
+    """Test that the meta knowledge graph is refreshed when the file changes."""
+    pool = ConnectionPool(database_file, size=1)
+    app = FastAPI()
+    app.include_router(kp_router(pool))
+    async with httpx.AsyncClient(app=app, base_url="http://kp") as client:
+        response = await client.get("/meta_knowledge_graph")
+        assert len(response.json()["edges"]) == 1
+
+        async with aiosqlite.connect(database_file) as connection:
+            await add_data_from_string(
+                connection,
+                data="""
+                    NCBIGene:123(( category biolink:Gene ))
+                    CHEBI:6801-- predicate biolink:affects -->NCBIGene:123
+                """,
+            )
+        response = await client.get("/meta_knowledge_graph")
+        assert len(response.json()["edges"]) == 2
+        assert "biolink:Gene" in response.json()["nodes"]
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_replaced_file(database_file):
+    """Test that connections are reopened when the file is replaced."""
+    pool = ConnectionPool(database_file, size=2)
+    app = FastAPI()
+    app.include_router(kp_router(pool, result_cache_size=8))
+    request = {
+        "message": {
+            "query_graph": {
+                "nodes": {
+                    "n0": {"categories": ["biolink:ChemicalSubstance"]},
+                    "n1": {"ids": ["MONDO:0005148"]},
+                },
+                "edges": {"e01": {"subject": "n0", "object": "n1"}},
+            }
+        }
+    }
+    async with httpx.AsyncClient(app=app, base_url="http://kp") as client:
+        response = await client.post("/query", json=request)
+        assert len(response.json()["message"]["results"]) == 1
+        response = await client.get("/meta_knowledge_graph")
+        assert len(response.json()["edges"]) == 1
+        stale = await pool.acquire()
+
+        # build the new version aside and move it into place, as in deployment
+        replacement = database_file + ".new"
+        async with aiosqlite.connect(replacement) as connection:
+            await add_data_from_string(
+                connection,
+                data="""
+                    MONDO:0005148(( category biolink:Disease ))
+                    MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+                    MONDO:0005148<-- predicate biolink:treats --CHEBI:6802
+                    CHEBI:6801(( category biolink:ChemicalSubstance ))
+                    CHEBI:6802(( category biolink:ChemicalSubstance ))
+                    NCBIGene:123(( category biolink:Gene ))
+                """,
+            )
+        os.replace(replacement, database_file)
+
+        response = await client.post("/query", json=request)
+        assert len(response.json()["message"]["results"]) == 2
+        response = await client.get("/meta_knowledge_graph")
+        assert "biolink:Gene" in response.json()["nodes"]
+        assert stale not in pool._connections
+        pool.release(stale)
+        assert not pool._retired
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_result_cache(database_file):
+    """Test that lookups are cached until the file changes."""
+    app = FastAPI()
+    app.include_router(kp_router(database_file, result_cache_size=8))
+    uncached_app = FastAPI()
+    uncached_app.include_router(kp_router(database_file))
+    request = {
+        "message": {
+            "query_graph": {
+                "nodes": {
+                    "n0": {"categories": ["biolink:ChemicalSubstance"]},
+                    "n1": {"ids": ["MONDO:0005148"]},
+                },
+                "edges": {"e01": {"subject": "n0", "object": "n1"}},
+            }
+        }
+    }
+    async with httpx.AsyncClient(app=uncached_app, base_url="http://kp") as client:
+        expected = (await client.post("/query", json=request)).json()
+    async with httpx.AsyncClient(app=app, base_url="http://kp") as client:
+        for _ in range(2):
+            response = await client.post("/query", json=request)
+            assert response.status_code == 200
+            assert response.json() == expected
+
+        async with aiosqlite.connect(database_file) as connection:
+            await add_data_from_string(
+                connection,
+                data="""
+                    CHEBI:6802(( category biolink:ChemicalSubstance ))
+                    CHEBI:6802-- predicate biolink:treats -->MONDO:0005148
+                """,
+            )
+        response = await client.post("/query", json=request)
+        assert len(response.json()["message"]["results"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_parallel_components():
+    """Test solving independent branches on separate connections."""
+    with tempfile.NamedTemporaryFile() as f:
+        async with aiosqlite.connect(f.name) as connection:
+            await add_data_from_string(
+                connection,
+                data="""
+                    CHEBI:6801(( category biolink:ChemicalSubstance ))
+                    MONDO:0005148(( category biolink:Disease ))
+                    MONDO:0005149(( category biolink:Disease ))
+                    NCBIGene:1(( category biolink:Gene ))
+                    NCBIGene:2(( category biolink:Gene ))
+                    HP:0000001(( category biolink:PhenotypicFeature ))
+                    CHEBI:6801-- predicate biolink:treats -->MONDO:0005148
+                    CHEBI:6801-- predicate biolink:treats -->MONDO:0005149
+                    CHEBI:6801-- predicate biolink:affects -->NCBIGene:1
+                    CHEBI:6801-- predicate biolink:affects -->NCBIGene:2
+                    NCBIGene:1-- predicate biolink:causes -->HP:0000001
+                """,
+            )
+        qgraph = {
+            "nodes": {
+                "n0": {"ids": ["CHEBI:6801"]},
+                "n1": {"categories": ["biolink:Disease"]},
+                "n2": {"categories": ["biolink:Gene"]},
+                "n3": {"categories": ["biolink:PhenotypicFeature"]},
+            },
+            "edges": {
+                "e01": {
+                    "subject": "n0",
+                    "object": "n1",
+                    "predicates": ["biolink:treats"],
+                },
+                "e02": {
+                    "subject": "n0",
+                    "object": "n2",
+                    "predicates": ["biolink:affects"],
+                },
+                "e23": {
+                    "subject": "n2",
+                    "object": "n3",
+                    "predicates": ["biolink:causes"],
+                },
+            },
+        }
+        async with KnowledgeProvider(f.name, strategy="join") as kp:
+            _, expected = await kp.get_results(qgraph)
+        assert len(expected) == 2
+
+        pool = ConnectionPool(f.name, size=2)
+        metrics = QueryMetrics()
+        async with KnowledgeProvider(
+            f.name, strategy="recursive", metrics=metrics, pool=pool
+        ) as kp:
+            kgraph, results = await kp.get_results(qgraph)
+        assert metrics.counts["components"] == 2
+        assert len(pool._connections) == 1
+        assert result_signature(results) == result_signature(expected)
+        assert {
+            binding["id"]
+            for result in results
+            for bindings in result["edge_bindings"].values()
+            for binding in bindings
+        } <= set(kgraph["edges"])
+
+        async with KnowledgeProvider(f.name, strategy="recursive") as kp:
+            _, results = await kp.get_results(qgraph, max_results=1)
+        assert len(results) == 1
+        assert kp.logs
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_workers(database_file):
+    """Test answering lookups in worker processes."""
+    app = FastAPI()
+    app.include_router(kp_router(database_file, workers=2, result_cache_size=8))
+    local_app = FastAPI()
+    local_app.include_router(kp_router(database_file))
+    request = {
+        "message": {
+            "query_graph": {
+                "nodes": {
+                    "n0": {"categories": ["biolink:ChemicalSubstance"]},
+                    "n1": {"ids": ["MONDO:0005148"]},
+                },
+                "edges": {"e01": {"subject": "n0", "object": "n1"}},
+            }
+        }
+    }
+    async with httpx.AsyncClient(app=local_app, base_url="http://kp") as client:
+        expected = (await client.post("/query", json=request)).json()
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://kp") as client:
+            for _ in range(2):
+                response = await client.post("/query", json=request)
+                assert response.status_code == 200
+                assert response.json() == expected
+    finally:
+        await app.router.shutdown()
+
+    with pytest.raises(ValueError):
+        kp_router(workers=2)
+
+
+def test_result_cache_bounds():
+    """Test result cache eviction by size, bytes, and age."""
+    now = [0.0]
+    cache = ResultCache(maxsize=2, maxbytes=10, ttl=5, timer=lambda: now[0])
+    cache.put("a", "A", 4)
+    cache.put("b", "B", 4)
+    assert cache.get("a") == "A"
+    cache.put("c", "C", 4)
+    assert cache.get("b") is None
+    assert cache.nbytes == 8
+    cache.put("d", "D", 11)
+    assert cache.get("d") is None
+    now[0] = 5.0
+    assert cache.get("a") is None
+    assert len(cache) == 1
+    assert (cache.hits, cache.misses) == (1, 3)
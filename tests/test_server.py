@@ -1,10 +1,18 @@
 """Test server."""
+import logging
+
+import aiosqlite
+from fastapi import FastAPI
 import httpx
 import pytest
 
+from binder.build_db import add_data_from_string
+import binder.router
+from binder.router import kp_router
 from binder.testing import kp_overlay
 
 from tests.logging_setup import setup_logger
+from tests.test_planner import result_signature
 
 setup_logger()
 
@@ -158,3 +166,133 @@ async def test_metakg():
     async with httpx.AsyncClient() as client:
         response = await client.get("http://kp/meta_knowledge_graph")
     assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch_size", [1, 256])
+async def test_streaming(monkeypatch, batch_size):
+    """Test that streamed responses match validated ones."""
+    monkeypatch.setattr(binder.router, "STREAM_BATCH_SIZE", batch_size)
+    request = {
+        "message": {
+            "query_graph": {
+                "nodes": {
+                    "n0": {"categories": ["biolink:ChemicalSubstance"]},
+                    "n1": {"ids": ["MONDO:0005148"]},
+                },
+                "edges": {"e01": {"subject": "n0", "object": "n1"}},
+            }
+        }
+    }
+    messages = []
+    async with aiosqlite.connect(":memory:") as connection:
+        await add_data_from_string(
+            connection,
+            data="""
+                MONDO:0005148(( category biolink:Disease ))
+                MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+                MONDO:0005148<-- predicate biolink:treats --CHEBI:6802
+                MONDO:0005148<-- predicate biolink:affects --CHEBI:6803
+                CHEBI:6801(( category biolink:ChemicalSubstance ))
+                CHEBI:6802(( category biolink:ChemicalSubstance ))
+                CHEBI:6803(( category biolink:ChemicalSubstance ))
+            """,
+        )
+        for streaming in (False, True):
+            app = FastAPI()
+            app.include_router(kp_router(connection, streaming=streaming))
+            async with httpx.AsyncClient(app=app, base_url="http://kp") as client:
+                response = await client.post("/query", json=request)
+            assert response.status_code == 200
+            messages.append(response.json()["message"])
+    expected, message = messages
+    assert len(message["results"]) == 3
+    assert result_signature(message["results"]) == result_signature(expected["results"])
+    for key in ("nodes", "edges"):
+        assert (
+            message["knowledge_graph"][key].keys()
+            == expected["knowledge_graph"][key].keys()
+        )
+    assert message["query_graph"] == expected["query_graph"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("streaming", [False, True])
+async def test_max_results(streaming):
+    """Test that truncation is reported in the response logs."""
+    request = {
+        "message": {
+            "query_graph": {
+                "nodes": {
+                    "n0": {"categories": ["biolink:ChemicalSubstance"]},
+                    "n1": {"ids": ["MONDO:0005148"]},
+                },
+                "edges": {"e01": {"subject": "n0", "object": "n1"}},
+            }
+        }
+    }
+    async with aiosqlite.connect(":memory:") as connection:
+        await add_data_from_string(
+            connection,
+            data="""
+                MONDO:0005148(( category biolink:Disease ))
+                MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+                MONDO:0005148<-- predicate biolink:treats --CHEBI:6802
+                CHEBI:6801(( category biolink:ChemicalSubstance ))
+                CHEBI:6802(( category biolink:ChemicalSubstance ))
+            """,
+        )
+        app = FastAPI()
+        app.include_router(kp_router(connection, streaming=streaming, max_results=1))
+        async with httpx.AsyncClient(app=app, base_url="http://kp") as client:
+            response = await client.post("/query", json=request)
+    assert response.status_code == 200
+    assert len(response.json()["message"]["results"]) == 1
+    (log,) = response.json()["logs"]
+    assert log["level"] == "WARNING"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("server_timing", [True, False])
+async def test_metrics(caplog, server_timing):
+    """Test per-query timings and counts."""
+    request = {
+        "message": {
+            "query_graph": {
+                "nodes": {
+                    "n0": {"categories": ["biolink:ChemicalSubstance"]},
+                    "n1": {"ids": ["MONDO:0005148"]},
+                },
+                "edges": {"e01": {"subject": "n0", "object": "n1"}},
+            }
+        }
+    }
+    async with aiosqlite.connect(":memory:") as connection:
+        await add_data_from_string(
+            connection,
+            data="""
+                MONDO:0005148(( category biolink:Disease ))
+                MONDO:0005148<-- predicate biolink:treats --CHEBI:6801
+                CHEBI:6801(( category biolink:ChemicalSubstance ))
+            """,
+        )
+        app = FastAPI()
+        app.include_router(kp_router(connection, server_timing=server_timing))
+        with caplog.at_level(logging.INFO, logger="binder.metrics"):
+            async with httpx.AsyncClient(app=app, base_url="http://kp") as client:
+                response = await client.post("/query", json=request)
+    assert response.status_code == 200
+    assert len(response.json()["message"]["results"]) == 1
+    (record,) = [record for record in caplog.records if record.name == "binder.metrics"]
+    phases = {"total", "normalize", "lookup", "sql", "knodes", "serialize"}
+    assert phases <= set(record.metrics["timings_ms"])
+    if server_timing:
+        assert phases <= {
+            entry.split(";")[0]
+            for entry in response.headers["Server-Timing"].split(", ")
+        }
+    else:
+        assert "Server-Timing" not in response.headers
+    # one join row, one kedge, and two knodes
+    assert record.metrics["counts"]["rows"] == 4
+    assert record.metrics["counts"]["knodes"] == 2
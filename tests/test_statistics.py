@@ -0,0 +1,136 @@
+"""Test cost-based qedge ordering."""
+import os
+import tempfile
+
+import aiosqlite
+import pytest
+
+from binder.build_db import add_data
+from binder.engine import KnowledgeProvider
+
+from .logging_setup import setup_logger
+
+
+setup_logger()
+
+
+PREDICATES = [
+    "biolink:interacts_with",
+    "biolink:affects",
+    "biolink:correlated_with",
+    "biolink:coexists_with",
+    "biolink:produces",
+    "biolink:expressed_in",
+    "biolink:causes",
+    "biolink:prevents",
+    "biolink:contributes_to",
+    "biolink:related_to",
+]
+
+
+@pytest.fixture
+async def connection():
+    """Return database connection with one rare and many common edges."""
+    nodes = [
+        {"id": "CHEBI:6801", "category": "biolink:ChemicalSubstance"},
+        {"id": "MONDO:0005148", "category": "biolink:Disease"},
+    ] + [{"id": f"NCBIGene:{idx}", "category": "biolink:Gene"} for idx in range(20)]
+    edges = [
+        {
+            "id": "treats",
+            "subject": "CHEBI:6801",
+            "predicate": "biolink:treats",
+            "object": "MONDO:0005148",
+        }
+    ] + [
+        {
+            "id": f"related{idx}",
+            "subject": "CHEBI:6801",
+            "predicate": PREDICATES[idx % len(PREDICATES)],
+            "object": f"NCBIGene:{idx}",
+        }
+        for idx in range(20)
+    ]
+    async with aiosqlite.connect(":memory:") as connection:
+        await add_data(connection, nodes, edges)
+        yield connection
+
+
+class CountingKnowledgeProvider(KnowledgeProvider):
+    """Knowledge provider counting kedge lookups."""
+
+    calls = 0
+
+    async def get_kedges(self, **kwargs):
+        """Get kedges."""
+        self.calls += 1
+        return await super().get_kedges(**kwargs)
+
+
+QGRAPH = {
+    "nodes": {
+        "drug": {"ids": ["CHEBI:6801"]},
+        "gene": {"categories": ["biolink:Gene"]},
+        "disease": {"categories": ["biolink:Disease"]},
+    },
+    "edges": {
+        "related": {"subject": "drug", "object": "gene"},
+        "treats": {
+            "subject": "drug",
+            "object": "disease",
+            "predicates": ["biolink:treats"],
+        },
+    },
+}
+
+
+@pytest.mark.asyncio
+async def test_selective_first(connection: aiosqlite.Connection):
+    """Test that the rare predicate is expanded first.
+
+    Expanding along the symmetric related_to qedge from one drug takes two
+    lookups, and would take two per gene if done last.
+    """
+    kp = CountingKnowledgeProvider(connection, strategy="recursive", memo_size=0)
+    _, results = await kp.get_results(QGRAPH)
+    assert len(results) == 20
+    assert kp.calls == 3
+    assert (await kp.get_statistics()).predicate_counts["biolink:treats"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stat1_fallback(connection: aiosqlite.Connection):
+    """Test ordering from sqlite_stat1 when count tables are missing."""
+    await connection.execute("DROP TABLE meta_predicate_counts")
+    kp = CountingKnowledgeProvider(connection, strategy="recursive", memo_size=0)
+    _, results = await kp.get_results(QGRAPH)
+    assert len(results) == 20
+    assert kp.calls == 3
+    assert (await kp.get_statistics()).num_edges == 21
+
+
+@pytest.mark.asyncio
+async def test_shared_statistics():
+    """Test that providers share statistics until the database file changes."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_file = os.path.join(tmpdir, "kp.db")
+        async with aiosqlite.connect(database_file) as connection:
+            await add_data(
+                connection,
+                [{"id": "CHEBI:6801", "category": "biolink:ChemicalSubstance"}],
+                [],
+            )
+        async with KnowledgeProvider(database_file) as kp:
+            statistics = await kp.get_statistics()
+        async with KnowledgeProvider(database_file) as kp:
+            assert await kp.get_statistics() is statistics
+        assert statistics.num_nodes == 1
+
+        async with aiosqlite.connect(database_file) as connection:
+            await add_data(
+                connection,
+                [{"id": "MONDO:0005148", "category": "biolink:Disease"}],
+                [],
+            )
+        async with KnowledgeProvider(database_file) as kp:
+            assert (await kp.get_statistics()).num_nodes == 2
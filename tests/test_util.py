@@ -1,5 +1,18 @@
 """Test utilities."""
-from binder.util import get_subcategories, get_subpredicates
+import subprocess
+import sys
+
+import pytest
+
+import binder.util
+from binder.util import (
+    get_biolink_hierarchy,
+    get_subcategories,
+    get_subpredicates,
+    get_toolkit,
+    is_symmetric,
+    load_biolink_hierarchy,
+)
 from binder.engine import normalize_qgraph
 
 
@@ -30,3 +43,35 @@ def test_normalize_qgraph():
     }
     normalize_qgraph(qgraph)
     assert qgraph["nodes"]["something"]["categories"]
+
+
+def test_biolink_hierarchy():
+    """Test precomputed Biolink hierarchy."""
+    hierarchy = load_biolink_hierarchy()
+    assert get_biolink_hierarchy() is hierarchy
+    assert "biolink:Disease" in hierarchy.subcategories
+    assert is_symmetric("biolink:related_to")
+    assert not is_symmetric("biolink:treats")
+    # lookups hand out copies of the table entries
+    get_subcategories("biolink:Disease").append("biolink:Foo")
+    assert get_subcategories("biolink:Disease") == ["biolink:Disease"]
+    with pytest.raises(TypeError):
+        hierarchy.subpredicates["biolink:treats"] = ()
+    # unknown elements fall through to the toolkit
+    assert get_subpredicates("biolink:unknown") == ["biolink:unknown"]
+
+
+def test_lazy_toolkit():
+    """Test that the Biolink model is not loaded at import time."""
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, binder.engine, binder.router; print('bmt' in sys.modules)",
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    assert output.strip() == "False"
+    assert binder.util.BMT is get_toolkit()